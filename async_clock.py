@@ -0,0 +1,77 @@
+"""
+Drift-free MIDI clock for asyncio programs
+
+usage:
+  clock = AsyncClock(midi_out, bpm=120)
+  async def part():
+      async for tick in clock.subscribe():
+          ...
+  await asyncio.gather(clock.run(), part())
+
+  async_clock.run(main()) # uses uvloop when it is installed
+"""
+import asyncio
+from time import monotonic
+from midi_bytes import CLOCK_BYTES, raw_sender
+
+class AsyncClock(object):
+    """
+    Send MIDI clock from a task that wakes on absolute time.monotonic()
+    deadlines (uvloop's loop.time() only has millisecond resolution), so
+    time spent in subscriber coroutines never stretches the tick interval.
+    Subscribers receive tick numbers through their own queues and run as
+    separate tasks.
+    """
+    def __init__(self, ports, bpm, ppqn=24, stats=None, spin=0.001):
+        ports = list(ports) if isinstance(ports, (list, tuple)) else [ports]
+        self.senders = [ raw_sender(port) for port in ports ]
+        self.bpm = bpm
+        self.ppqn = ppqn
+        self.stats = stats
+        self.spin = spin # seconds of busy-wait to make up for the loop's timer resolution
+        self.ticks = 0
+        self.queues = []
+
+    @property
+    def interval(self):
+        return 60 / (self.bpm * self.ppqn)
+
+    def subscribe(self, every=1):
+        """Yield the tick number of every every-th tick"""
+        queue = asyncio.Queue()
+        self.queues.append((every, queue))
+        async def ticks():
+            while True:
+                yield await queue.get()
+        return ticks()
+
+    async def run(self):
+        interval = self.interval
+        start = monotonic()
+        if self.stats:
+            self.stats.start(start)
+        while True:
+            deadline = start + self.ticks * interval
+            delay = deadline - monotonic() - self.spin
+            if delay > 0:
+                await asyncio.sleep(delay)
+            while monotonic() < deadline:
+                pass
+            for send in self.senders:
+                send(CLOCK_BYTES)
+            if self.stats:
+                self.stats.tick(deadline)
+            self.ticks += 1
+            for every, queue in self.queues:
+                if self.ticks % every == 0:
+                    queue.put_nowait(self.ticks)
+
+def run(main, use_uvloop=True):
+    """asyncio.run(main) on uvloop if it is available"""
+    if use_uvloop:
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            pass
+    return asyncio.run(main)
@@ -0,0 +1,80 @@
+"""
+Broadcast beat bus for stream threads that share one clock
+
+usage:
+  bus = BeatBus()
+  clock = Clock(outport, bpm, on_beat=bus.publish)
+  ... in each stream thread:
+  beats = bus.subscribe('bass')
+  while not stop_threads:
+      beat = beats.wait() # None once the bus is closed
+"""
+import threading
+import time
+from clock_stats import Histogram
+
+class BeatBus(object):
+    """
+    Publish numbered beats to any number of subscribers. Unlike a shared
+    threading.Event, no subscriber can consume a beat on behalf of another:
+    each one keeps its own sequence number.
+    """
+    def __init__(self, grace=0.02):
+        self.cond = threading.Condition()
+        self.grace = grace # seconds a just-missed beat is still delivered
+        self.beat = 0
+        self.beat_time = None
+        self.closed = False
+        self.subscribers = []
+
+    def publish(self):
+        with self.cond:
+            self.beat += 1
+            self.beat_time = time.monotonic()
+            self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def subscribe(self, name):
+        subscriber = Subscriber(self, name)
+        with self.cond:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def report(self):
+        for s in self.subscribers:
+            late = s.latency.summary()
+            print(f"{s.name}: {late['count']} beats, wake-up p50 {late['p50']}us, "
+                  f"p99 {late['p99']}us, max {late['max']}us, {s.skipped} skipped")
+
+class Subscriber(object):
+    def __init__(self, bus, name):
+        self.bus = bus
+        self.name = name
+        self.seen = bus.beat
+        self.skipped = 0 # beats that went by while the subscriber was busy
+        self.latency = Histogram() # microseconds from publish to wake-up
+
+    def wait(self, timeout=None):
+        """
+        Block until the next beat and return its number. A beat published
+        within the bus grace period before the call counts as the next one,
+        so a thread that finishes its phrase right on the beat does not lose
+        it. Returns None on timeout or once the bus is closed.
+        """
+        bus = self.bus
+        with bus.cond:
+            if bus.beat > self.seen and time.monotonic() - bus.beat_time > bus.grace:
+                self.skipped += bus.beat - self.seen
+                self.seen = bus.beat
+            if not bus.cond.wait_for(lambda: bus.closed or bus.beat > self.seen, timeout):
+                return None
+            if bus.closed:
+                return None
+            self.skipped += bus.beat - self.seen - 1
+            self.seen = bus.beat
+            self.latency.record((time.monotonic() - bus.beat_time) * 1e6)
+            return self.seen
@@ -0,0 +1,64 @@
+"""
+Memoized pychord chord symbol expansion
+
+usage:
+  import chord_cache
+  chord_cache.components('Am7')   # ['A', 'C', 'E', 'G']
+  chord_cache.pitches('Am7', 4)   # ['A4', 'C5', 'E5', 'G5']
+  chord_cache.midi_notes('Am7', 4) # [69, 72, 76, 79]
+  chord_cache.report()            # hit rate of the caches
+"""
+from functools import lru_cache
+import pychord
+import pitch_table
+
+MAXSIZE = 512 # distinct (symbol, octave) pairs kept
+
+@lru_cache(maxsize=MAXSIZE)
+def _components(symbol):
+    return tuple(pychord.Chord(symbol).components())
+
+@lru_cache(maxsize=MAXSIZE)
+def _pitches(symbol, octave):
+    return tuple(pychord.Chord(symbol).components_with_pitch(root_pitch=octave))
+
+@lru_cache(maxsize=MAXSIZE)
+def _midi_notes(symbol, octave):
+    return tuple(pitch_table.midi(p) for p in _pitches(symbol, octave))
+
+# the cached tuples are shared, so callers get their own lists to change
+def components(symbol):
+    """pychord.Chord(symbol).components()"""
+    return list(_components(symbol))
+
+def pitches(symbol, octave=4):
+    """pychord.Chord(symbol).components_with_pitch(root_pitch=octave)"""
+    return list(_pitches(symbol, octave))
+
+def midi_notes(symbol, octave=4):
+    """MIDI numbers of pitches(symbol, octave)"""
+    return list(_midi_notes(symbol, octave))
+
+def info():
+    """Combined hits, misses and hit rate of the caches"""
+    hits = misses = size = 0
+    for cached in (_components, _pitches, _midi_notes):
+        i = cached.cache_info()
+        hits += i.hits
+        misses += i.misses
+        size += i.currsize
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'size': size,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+def report():
+    i = info()
+    print(f"Chord cache: {i['hits']} hits, {i['misses']} misses ({100 * i['hit_rate']:.1f}% hit rate), {i['size']} entries")
+
+def clear():
+    for cached in (_components, _pitches, _midi_notes):
+        cached.cache_clear()
@@ -7,9 +7,11 @@ from fritter.repeat import repeatedly
 from fritter.repeat.rules.seconds import EverySecond
 from fritter.scheduler import schedulerFromDriver
 from mido import Message, open_output  # type:ignore[import-untyped]
+from clock_stats import ClockStats
 
 def clock(steps: int, scheduled: SomeScheduledCall) -> None:
     midi_out.send(Message("clock"))
+    stats.tick()
     print("MIDI clock sent")
 
 async def main(interval: float) -> None:
@@ -24,6 +26,7 @@ if __name__ == "__main__":
     bpm = int(sys.argv[2]) if len(sys.argv) > 2 else 120
 
     clock_interval = 60 / bpm / 24 # seconds / bpm / ppqn
+    stats = ClockStats('clock-gen-async', bpm, 24)
 
     with open_output(name) as midi_out:
         midi_out.send(Message("start"))
@@ -32,3 +35,5 @@ if __name__ == "__main__":
         except KeyboardInterrupt:
             midi_out.send(Message("stop"))
             print("\nStop")
+        finally:
+            stats.report()
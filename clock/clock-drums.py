@@ -1,8 +1,13 @@
+import os
 import sys
-from time import sleep, time
+from time import monotonic, sleep
 import mido
 import threading
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from clock_stats import ClockStats
+import realtime
+
 CLOCK = mido.Message('clock')
 
 class DrumPattern:
@@ -14,7 +19,7 @@ class DrumPattern:
 
 class Generator(object):
 
-    def __init__(self, port, bpm, tpb, drum_pattern=None):
+    def __init__(self, port, bpm, tpb, drum_pattern=None, stats=None, realtime=None):
         self.port = port
         self.bpm = bpm
         self.tpb = tpb
@@ -22,6 +27,8 @@ class Generator(object):
         self.running = False
         self.thread = None
         self.drum_pattern = drum_pattern
+        self.stats = stats
+        self.realtime = realtime # realtime.set_realtime() settings, default $CLOCK_REALTIME
 
     def start(self):
         self.running = True
@@ -34,18 +41,25 @@ class Generator(object):
             self.thread.join()
 
     def _run(self):
-        initial_time = time()
+        settings = realtime.from_env() if self.realtime is None else self.realtime
+        if settings:
+            realtime.set_realtime(**settings)
+        initial_time = monotonic()
         tick_time = 60. / self.bpm / self.tpb
         wait_time = tick_time / 1.5
         sleep_time = wait_time / 2.
+        if self.stats:
+            self.stats.start(initial_time)
         while self.running:
             next_time = initial_time + (tick_time * self.ticks)
-            while time() + wait_time < next_time and self.running:
+            while monotonic() + wait_time < next_time and self.running:
                 sleep(sleep_time)
-            while time() < next_time and self.running:
+            while monotonic() < next_time and self.running:
                 pass
             if self.running:
                 self.tick()
+                if self.stats:
+                    self.stats.tick(next_time)
                 self.ticks += 1
 
     @property
@@ -79,13 +93,15 @@ if __name__ == "__main__":
 
     with mido.open_output('MIDIThing2') as outport:
         outport.send(mido.Message('start'))
-        gen = Generator(port=outport, bpm=bpm, tpb=24, drum_pattern=pattern)
+        stats = ClockStats('clock-drums', bpm, 24)
+        gen = Generator(port=outport, bpm=bpm, tpb=24, drum_pattern=pattern, stats=stats)
         try:
             gen.start()
             while True:
                 sleep(1)
         except KeyboardInterrupt:
             gen.stop()
+            stats.report()
             outport.send(mido.Message('stop'))
             for c in [0,1,2,3]:
                 msg = mido.Message('control_change', channel=c, control=123, value=0)
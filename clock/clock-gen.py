@@ -1,30 +1,57 @@
+import os
 import sys
-from time import sleep, time
+from time import monotonic, process_time, sleep
 import mido
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from clock_stats import ClockStats
+from midi_clock import absolute_sleeper
+import realtime
+
 CLOCK = mido.Message('clock')
 
 class Generator(object):
 
-    def __init__(self, port, bpm, tpb):
+    def __init__(self, port, bpm, tpb, wait='spin', spin=0.0005, realtime=None):
         self.port = port
         self.bpm = bpm
         self.tpb = tpb
         self.ticks = 0
+        self.wait = wait # 'spin' = sleep then busy-wait, 'sleep' = absolute deadline sleep
+        self.spin = spin # seconds of busy-wait allowed before each deadline in 'sleep' mode
+        self.stats = ClockStats('clock-gen', bpm, tpb)
+        self.realtime = realtime # realtime.set_realtime() settings, default $CLOCK_REALTIME
+        self.cpu_time = 0
+        self.wall_time = 0
 
     def start(self):
-        initial_time = time()
+        settings = realtime.from_env() if self.realtime is None else self.realtime
+        if settings:
+            realtime.set_realtime(**settings)
+        initial_time = monotonic()
+        initial_cpu = process_time()
         tick_time = 60. / self.bpm / self.tpb
         wait_time = tick_time / 1.5
         sleep_time = wait_time / 2.
-        while True:
-            next_time = initial_time + (tick_time * self.ticks)
-            while time() + wait_time < next_time:
-                sleep(sleep_time)
-            while time() < next_time:
-                pass
-            self.tick()
-            self.ticks += 1
+        sleep_until = absolute_sleeper()
+        spin = min(self.spin, tick_time)
+        self.stats.start(initial_time)
+        try:
+            while True:
+                next_time = initial_time + (tick_time * self.ticks)
+                if self.wait == 'sleep':
+                    sleep_until(next_time - spin)
+                else:
+                    while monotonic() + wait_time < next_time:
+                        sleep(sleep_time)
+                while monotonic() < next_time:
+                    pass
+                self.tick()
+                self.stats.tick(next_time)
+                self.ticks += 1
+        finally:
+            self.wall_time = monotonic() - initial_time
+            self.cpu_time = process_time() - initial_cpu
 
     @property
     def beat(self):
@@ -37,14 +64,26 @@ class Generator(object):
     def tick(self):
         self.port.send(CLOCK)
 
+    def report(self):
+        if not self.wall_time:
+            return
+        cpu = 100 * self.cpu_time / self.wall_time
+        spin = f" ({self.spin * 1e6:.0f}us spin window)" if self.wait == 'sleep' else ''
+        print(f"Wait: {self.wait}{spin}")
+        print(f"CPU: {cpu:.1f}% of one core over {self.wall_time:.1f}s")
+        self.stats.report()
+
 if __name__ == "__main__":
     bpm = int(sys.argv[1]) if len(sys.argv) > 1 else 120
     name = sys.argv[2] if len(sys.argv) > 2 else 'SE-02'
+    wait = sys.argv[3] if len(sys.argv) > 3 else 'spin' # or 'sleep'
+    spin = int(sys.argv[4]) / 1e6 if len(sys.argv) > 4 else 0.0005 # microseconds
 
     with mido.open_output(name) as outport:
         outport.send(mido.Message('start'))
-        gen = Generator(port=outport, bpm=bpm, tpb=24)
+        gen = Generator(port=outport, bpm=bpm, tpb=24, wait=wait, spin=spin)
         try:
             gen.start()
         except KeyboardInterrupt:
-            outport.send(mido.Message('stop'))
\ No newline at end of file
+            outport.send(mido.Message('stop'))
+            gen.report()
@@ -0,0 +1,149 @@
+"""
+Follow an external MIDI clock, e.g. a hardware sequencer acting as master
+
+usage:
+  clock = ClockFollower('USB MIDI Interface', on_beat=clock_tick_event.set)
+  clock.start()
+  ...
+  clock.stop()
+"""
+import threading
+from time import monotonic
+import mido
+from clock_stats import Histogram
+from midi_clock import absolute_sleeper
+
+class ClockFollower(object):
+    """
+    Timestamp incoming 0xF8 messages and track them with an alpha-beta
+    (second order) phase-locked loop. Beats are fired from the loop's
+    smoothed estimate of when every ppqn-th tick is due, not from the raw
+    arrival times, so jitter on the incoming clock does not reach the notes.
+
+    alpha sets how fast the phase follows the incoming ticks and beta how
+    fast the tempo does; smaller values smooth more but lock more slowly.
+    """
+    def __init__(self, port_name, ppqn=24, on_beat=None, alpha=0.05, beta=0.002, bpm=120):
+        self.port_name = port_name
+        self.ppqn = ppqn
+        if on_beat is None:
+            on_beat = []
+        self.on_beat = list(on_beat) if isinstance(on_beat, (list, tuple)) else [on_beat]
+        self.alpha = alpha
+        self.beta = beta
+        self.period = 60 / (bpm * ppqn) # estimated seconds per tick
+        self.phase = None # estimated time of the last received tick
+        self.ticks = 0 # ticks received since start
+        self.beats = 0 # beats fired
+        self.last_arrival = None
+        self.jitter = Histogram() # microseconds between arrival and prediction
+        self.cond = threading.Condition()
+        self.running = False
+        self.port = None
+        self.thread = None
+        self.sleep_until = absolute_sleeper()
+
+    @property
+    def bpm(self):
+        return 60 / (self.period * self.ppqn)
+
+    @property
+    def beat_tick(self):
+        return self.ticks % self.ppqn
+
+    def tick_time(self, tick):
+        """Estimated monotonic() time at which the incoming tick count reaches tick"""
+        with self.cond:
+            if self.phase is None:
+                return monotonic()
+            return self.phase + (tick - self.ticks) * self.period
+
+    def wait_for_tick(self, tick):
+        """Sleep until the estimated time of tick; return how late the wake-up was"""
+        due = self.tick_time(tick)
+        if due - monotonic() > 4 * self.period:
+            # far off: sleep most of the way, then re-estimate from newer ticks
+            self.sleep_until(due - 2 * self.period)
+            due = self.tick_time(tick)
+        self.sleep_until(due)
+        return monotonic() - due
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.port = mido.open_input(self.port_name, callback=self._receive)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.port:
+            self.port.close()
+        if self.thread:
+            self.thread.join()
+
+    def reset(self):
+        with self.cond:
+            self.phase = None
+            self.ticks = 0
+            self.beats = 0
+            self.last_arrival = None
+            self.cond.notify_all()
+
+    def _receive(self, msg):
+        now = monotonic()
+        if msg.type == 'start':
+            self.reset()
+            return
+        if msg.type != 'clock':
+            return
+        with self.cond:
+            if self.phase is None or now - self.last_arrival > 4 * self.period:
+                # first tick, or the clock stopped and came back: relock
+                self.beats = self.ticks // self.ppqn
+                self.phase = now
+            elif self.ticks == 1:
+                # take the tempo from the first interval, then start filtering
+                self.period = now - self.last_arrival
+                self.phase = now
+            else:
+                predicted = self.phase + self.period
+                error = now - predicted
+                self.jitter.record(abs(error) * 1e6)
+                self.phase = predicted + self.alpha * error
+                self.period += self.beta * error
+            self.last_arrival = now
+            self.ticks += 1
+            self.cond.notify_all()
+
+    def _run(self):
+        sleep_until = absolute_sleeper()
+        while True:
+            with self.cond:
+                if not self.running:
+                    return
+                if self.phase is None or monotonic() - self.last_arrival > 4 * self.period:
+                    # nothing to follow yet, or the master went quiet
+                    self.cond.wait(0.1)
+                    continue
+                next_tick = (self.beats + 1) * self.ppqn
+                if next_tick < self.ticks - self.ppqn // 2:
+                    # fell behind the master, skip to its current beat
+                    self.beats = self.ticks // self.ppqn
+                    continue
+                due = self.phase + (next_tick - self.ticks) * self.period
+                wait = due - monotonic()
+                if wait > self.period:
+                    # re-estimate when the next tick arrives
+                    self.cond.wait(wait - self.period)
+                    continue
+            sleep_until(due)
+            self.beats += 1
+            for fn in self.on_beat:
+                fn()
+
+    def report(self):
+        jitter = self.jitter.summary()
+        print(f"Followed {self.port_name}: {self.ticks} ticks, {self.beats} beats, ~{self.bpm:.1f} BPM")
+        print(f"  incoming jitter p50 {jitter['p50']}us, p99 {jitter['p99']}us, max {jitter['max']}us")
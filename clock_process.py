@@ -0,0 +1,189 @@
+"""
+MIDI clock in a dedicated process, so generation work in the player's
+threads cannot stall it by holding the GIL
+
+usage:
+  clock = ClockProcess(outport.name, bpm=100, on_beat=clock_tick_event.set)
+  clock.start()
+  ...
+  clock.stop()
+
+The child opens the clock's output ports itself. ALSA and CoreMIDI
+outputs can be opened by both processes, but WinMM outputs are
+exclusive: on Windows the parent must not hold the clock's ports open,
+so give the clock a port of its own there.
+"""
+import multiprocessing
+import signal
+import struct
+import threading
+from multiprocessing import shared_memory
+from time import monotonic
+import mido
+from midi_clock import Clock, absolute_sleeper
+
+# ticks, beats, start time
+LAYOUT = struct.Struct('<QQd')
+# seconds to wait for the child to open its ports and start the clock
+STARTUP_TIMEOUT = 10
+
+class SharedClock(Clock):
+    """Clock that also publishes its counters to a shared memory block"""
+    def __init__(self, ports, bpm, ppqn, shm, conn, **kwargs):
+        super().__init__(ports, bpm, ppqn, **kwargs)
+        self.shm = shm
+        self.conn = conn
+        self.on_beat.append(self.notify)
+
+    def tick(self):
+        super().tick()
+        LAYOUT.pack_into(self.shm.buf, 0, self.ticks + 1, (self.ticks + 1) // self.ppqn, self.start_time)
+
+    def notify(self):
+        self.conn.send(self.beats)
+
+def run_clock(port_names, bpm, ppqn, shm_name, conn, stop_event, stats, realtime, fanout):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # the parent decides when to stop
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ports = []
+    try:
+        for name in port_names:
+            ports.append(mido.open_output(name))
+        clock = SharedClock(ports, bpm, ppqn, shm, conn, stats=stats, realtime=realtime, fanout=fanout)
+    except Exception as e:
+        # e.g. an exclusive port the parent already holds, or a missing backend
+        try:
+            conn.send(e)
+        except Exception:
+            conn.send(RuntimeError(repr(e))) # the exception itself cannot be pickled
+        for port in ports:
+            port.close()
+        shm.close()
+        return
+    conn.send('started') # before the clock thread starts sending beats
+    try:
+        clock.start()
+        stop_event.wait()
+        clock.stop()
+        clock.fanout.report()
+        conn.send(stats)
+    finally:
+        for port in ports:
+            port.close()
+        shm.close()
+
+class ClockProcess(object):
+    """
+    Run a midi_clock.Clock in a child process that opens its own output
+    ports. Tick and beat counters are read from shared memory, and on_beat
+    callbacks run in a parent thread that is woken once per beat. The
+    child is started with start_method ('spawn' by default) rather than
+    forked from a parent that already has ports and threads running.
+    start() waits for the child and raises its error if it cannot open
+    the ports or set up the clock.
+    """
+    def __init__(self, port_names, bpm, ppqn=24, on_beat=None, stats=None, realtime=None, fanout='ordered', start_method='spawn'):
+        self.port_names = list(port_names) if isinstance(port_names, (list, tuple)) else [port_names]
+        self.bpm = bpm
+        self.ppqn = ppqn
+        if on_beat is None:
+            on_beat = []
+        self.on_beat = list(on_beat) if isinstance(on_beat, (list, tuple)) else [on_beat]
+        self.stats = stats
+        self.realtime = realtime
+        self.fanout = fanout
+        self.context = multiprocessing.get_context(start_method)
+        self.shm = None
+        self.process = None
+        self.thread = None
+        self.sleep_until = absolute_sleeper()
+
+    @property
+    def interval(self):
+        return 60 / (self.bpm * self.ppqn)
+
+    @property
+    def ticks(self):
+        return LAYOUT.unpack_from(self.shm.buf, 0)[0] if self.shm else 0
+
+    @property
+    def beats(self):
+        return LAYOUT.unpack_from(self.shm.buf, 0)[1] if self.shm else 0
+
+    @property
+    def beat_tick(self):
+        return self.ticks % self.ppqn
+
+    def tick_time(self, tick):
+        """The monotonic() time at which the tick counter reaches tick"""
+        start = LAYOUT.unpack_from(self.shm.buf, 0)[2] if self.shm else 0
+        if not start:
+            return monotonic() # the child clock has not started yet
+        return start + (tick - 1) * self.interval
+
+    def wait_for_tick(self, tick):
+        """Sleep until the tick counter reaches tick; return how late the wake-up was"""
+        due = self.tick_time(tick)
+        self.sleep_until(due)
+        return monotonic() - due
+
+    def start(self):
+        self.shm = shared_memory.SharedMemory(create=True, size=LAYOUT.size)
+        LAYOUT.pack_into(self.shm.buf, 0, 0, 0, 0.0)
+        self.conn, child_conn = self.context.Pipe()
+        self.stop_event = self.context.Event()
+        self.process = self.context.Process(
+            target=run_clock,
+            args=(self.port_names, self.bpm, self.ppqn, self.shm.name, child_conn, self.stop_event, self.stats, self.realtime, self.fanout),
+            daemon=True,
+        )
+        self.process.start()
+        started = None
+        try:
+            if self.conn.poll(STARTUP_TIMEOUT):
+                started = self.conn.recv()
+        except (EOFError, OSError):
+            pass # the child died before it could report
+        if started != 'started':
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+            exitcode = self.process.exitcode
+            self.conn.close()
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+            self.process = None
+            if isinstance(started, Exception):
+                raise started
+            raise RuntimeError(f"the clock process did not start (exit code {exitcode})")
+        self.thread = threading.Thread(target=self._listen, daemon=True)
+        self.thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                beat = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if not isinstance(beat, int):
+                # the clock's final statistics
+                if self.stats is not None:
+                    vars(self.stats).update(vars(beat))
+                break
+            for fn in self.on_beat:
+                fn()
+
+    def stop(self):
+        if not self.process:
+            return
+        self.stop_event.set()
+        self.thread.join(timeout=2)
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        self.process = None
@@ -0,0 +1,125 @@
+"""
+Tick lateness and drift telemetry for the MIDI clock loops
+
+usage:
+  stats = ClockStats('midi-thread-1', bpm=100)
+  ... in the clock loop, right after each clock message goes out:
+  stats.tick()
+  ... on exit:
+  stats.report() # also appends a JSON line to $CLOCK_STATS, if set
+"""
+import json
+import os
+import time
+
+class Histogram(object):
+    """
+    HDR-style log-linear histogram of non-negative integer values (e.g.
+    microseconds). Each power-of-two range is split into 2**precision
+    buckets, so the relative error of any reported value stays under
+    1 / 2**precision no matter how large the value is.
+    """
+    def __init__(self, precision=7):
+        self.precision = precision
+        self.counts = {}
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        value = max(0, int(value))
+        shift = max(0, value.bit_length() - self.precision)
+        key = (value >> shift) << shift # lower bound of the bucket
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.total += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if not self.total:
+            return 0
+        rank = p / 100 * self.total
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                return min(key, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.total,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+class ClockStats(object):
+    """
+    Measure how late each clock message goes out and how far the clock has
+    drifted from the wall-clock tempo.
+
+    Lateness is measured against the tick's scheduled time, if the loop
+    knows it, or else against the ideal grid start + n * interval. Drift is
+    the number of ticks that should have gone out by now minus the number
+    that did.
+    """
+    def __init__(self, name, bpm, ppqn=24):
+        self.name = name
+        self.bpm = bpm
+        self.ppqn = ppqn
+        self.interval = 60 / (bpm * ppqn)
+        self.lateness = Histogram() # microseconds
+        self.ticks = 0
+        self.early = 0
+        self.drift = 0.0 # ticks
+        self.max_drift = 0.0
+        self.start_time = None
+
+    def start(self, now=None):
+        self.start_time = time.monotonic() if now is None else now
+
+    def tick(self, scheduled=None, now=None):
+        if now is None:
+            now = time.monotonic()
+        if self.start_time is None:
+            self.start(now)
+        if scheduled is None:
+            scheduled = self.start_time + self.ticks * self.interval
+        late = now - scheduled
+        if late < 0:
+            self.early += 1
+        self.lateness.record(late * 1e6)
+        self.ticks += 1
+        self.drift = (now - self.start_time) / self.interval + 1 - self.ticks
+        if abs(self.drift) > abs(self.max_drift):
+            self.max_drift = self.drift
+
+    def summary(self):
+        elapsed = 0.0
+        if self.start_time is not None:
+            elapsed = time.monotonic() - self.start_time
+        lateness = self.lateness.summary()
+        return {
+            'name': self.name,
+            'bpm': self.bpm,
+            'ppqn': self.ppqn,
+            'ticks': self.ticks,
+            'elapsed': round(elapsed, 3),
+            'lateness_us': lateness,
+            'early': self.early,
+            'drift_ticks': round(self.drift, 3),
+            'max_drift_ticks': round(self.max_drift, 3),
+        }
+
+    def report(self, path=None):
+        """Print a summary and append it as a JSON line to path or $CLOCK_STATS"""
+        s = self.summary()
+        late = s['lateness_us']
+        print(f"{s['name']}: {s['ticks']} ticks in {s['elapsed']}s at {s['bpm']} BPM")
+        print(f"  lateness p50 {late['p50']}us, p99 {late['p99']}us, max {late['max']}us ({s['early']} early)")
+        print(f"  drift {s['drift_ticks']} ticks (max {s['max_drift_ticks']})")
+        path = path or os.environ.get('CLOCK_STATS')
+        if path:
+            with open(path, 'a') as f:
+                f.write(json.dumps(s) + '\n')
+        return s
@@ -7,6 +7,8 @@ import mido
 from mido import Message
 from music_creatingrhythms import Rhythms
 from find_primes import all_primes
+from clock_stats import ClockStats
+from async_clock import AsyncClock, run
 
 def adjust_drums(mcr, drums, primes_dict, toggle):
     p = random.choice(primes_dict['all'])
@@ -28,6 +30,36 @@ def adjust_drums(mcr, drums, primes_dict, toggle):
         toggle[0] = 0
     return drums['hihat']['pat'][0]
 
+async def drum_steps(clock, midi_out, drums, primes_dict, beats, divisions, sixteenth):
+    mcr = Rhythms()
+    beat_count = [0]
+    toggle = [0]
+    queue = []
+
+    async for tick in clock.subscribe():
+        if tick % sixteenth == 0:
+            if beat_count[0] % (beats * divisions) == 0:
+                adjust_drums(mcr, drums, primes_dict, toggle)
+
+            for drum in drums:
+                if drums[drum]['pat'][beat_count[0] % beats]:
+                    queue.append({'drum': drum, 'velocity': 127})
+
+            for item in queue:
+                drum_name = item['drum']
+                msg = Message('note_on', channel=drums[drum_name]['chan'],
+                            note=drums[drum_name]['num'], velocity=item['velocity'])
+                midi_out.send(msg)
+
+            beat_count[0] += 1
+        else:
+            while queue:
+                item = queue.pop()
+                drum_name = item['drum']
+                msg = Message('note_off', channel=drums[drum_name]['chan'],
+                            note=drums[drum_name]['num'], velocity=0)
+                midi_out.send(msg)
+
 async def main():
     name = sys.argv[1] if len(sys.argv) > 1 else 'USB MIDI Interface'
     bpm  = int(sys.argv[2]) if len(sys.argv) > 2 else 120
@@ -42,7 +74,6 @@ async def main():
     beats = 16
     divisions = 4
     clocks_per_beat = 24
-    clock_interval = 60 / bpm / clocks_per_beat
     sixteenth = clocks_per_beat / divisions
 
     primes_dict = {
@@ -51,45 +82,21 @@ async def main():
         'to_7': all_primes(7, 'list'),
     }
 
-    ticks = [0]
-    beat_count = [0]
-    toggle = [0]
-    queue = []
+    stats = ClockStats('clocked-euclidean-drums', bpm, clocks_per_beat)
 
     try:
         with mido.open_output(name) as midi_out:
-            mcr = Rhythms()
-
-            while True:
-                midi_out.send(Message('clock'))
-                ticks[0] += 1
+            clock = AsyncClock(midi_out, bpm, clocks_per_beat, stats=stats)
+            await asyncio.gather(
+                clock.run(),
+                drum_steps(clock, midi_out, drums, primes_dict, beats, divisions, sixteenth),
+            )
+    finally:
+        stats.report()
 
-                if ticks[0] % sixteenth == 0:
-                    if beat_count[0] % (beats * divisions) == 0:
-                        adjust_drums(mcr, drums, primes_dict, toggle)
-
-                    for drum in drums:
-                        if drums[drum]['pat'][beat_count[0] % beats]:
-                            queue.append({'drum': drum, 'velocity': 127})
-
-                    for item in queue:
-                        drum_name = item['drum']
-                        msg = Message('note_on', channel=drums[drum_name]['chan'],
-                                    note=drums[drum_name]['num'], velocity=item['velocity'])
-                        midi_out.send(msg)
-
-                    beat_count[0] += 1
-                else:
-                    while queue:
-                        item = queue.pop()
-                        drum_name = item['drum']
-                        msg = Message('note_off', channel=drums[drum_name]['chan'],
-                                    note=drums[drum_name]['num'], velocity=0)
-                        midi_out.send(msg)
-
-                await asyncio.sleep(clock_interval)
+if __name__ == '__main__':
+    use_uvloop = sys.argv[4] != 'asyncio' if len(sys.argv) > 4 else True
+    try:
+        run(main(), use_uvloop=use_uvloop)
     except KeyboardInterrupt:
         print("\nStop")
-
-if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
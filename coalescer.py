@@ -0,0 +1,136 @@
+"""
+Thin out high-rate control change and pitchwheel streams to the latest
+value per time slice
+
+usage:
+  coalescer = Coalescer(rate=100, rates={ ('control_change', 1): 50 })
+  coalescer.start()
+  ... in the input callback:
+  if coalescer.coalesces(msg):
+      coalescer.submit(msg, lambda: route(routes, msg))
+  ...
+  coalescer.stop() # sends the values still held back
+  coalescer.report()
+"""
+import heapq
+import threading
+from time import monotonic
+
+# the incoming message field each coalesced type is keyed on
+FIELDS = {
+    'control_change': 'control',
+    'pitchwheel': None,
+}
+
+class Coalescer(object):
+    """
+    Forward at most rate messages per second for each channel and
+    controller (or pitchwheel). The first message of a slice goes out at
+    once; later ones in the same slice replace each other and only the
+    last is sent, from a flusher thread, when the slice ends, so a sweep
+    always lands on its final value. rates maps (type, control) to a
+    per-route rate, with control None for pitchwheel; a rate of 0 turns
+    coalescing off for that route.
+    """
+    def __init__(self, rate=100, rates=None):
+        self.rate = rate
+        self.rates = rates or {}
+        self.cond = threading.Condition()
+        self.slots = {} # (type, channel, control): [slice end, held action]
+        self.heap = [] # (slice end, key) of the slots holding an action
+        self.forwarded = {} # per (type, control)
+        self.dropped = {} # "
+        self.running = False
+        self.thread = None
+
+    def coalesces(self, msg):
+        return msg.type in FIELDS
+
+    def interval(self, route):
+        rate = self.rates.get(route, self.rate)
+        return 1 / rate if rate else 0
+
+    def submit(self, msg, action):
+        """Call action() now, at the end of the current slice, or never if a later message replaces it"""
+        field = FIELDS[msg.type]
+        route = (msg.type, getattr(msg, field) if field else None)
+        key = (msg.type, msg.channel, route[1])
+        now = monotonic()
+        with self.cond:
+            slot = self.slots.get(key)
+            if slot is None:
+                slot = self.slots[key] = [0.0, None]
+                self.forwarded.setdefault(route, 0)
+                self.dropped.setdefault(route, 0)
+            if slot[1] is None and now >= slot[0]:
+                slot[0] = now + self.interval(route)
+                self.forwarded[route] += 1
+            else:
+                if slot[1] is None:
+                    heapq.heappush(self.heap, (slot[0], key))
+                    if self.heap[0][1] == key:
+                        self.cond.notify() # new earliest slice end
+                else:
+                    self.dropped[route] += 1
+                slot[1] = action
+                return
+        action()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the flusher and send whatever is still held back"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread:
+            self.thread.join()
+        with self.cond:
+            due, self.heap = self.heap, []
+            actions = self._take(due, monotonic())
+        for action in actions:
+            action()
+
+    def _take(self, due, now):
+        """Clear the held actions of the due slots and start their next slices"""
+        actions = []
+        for _, key in due:
+            slot = self.slots[key]
+            route = (key[0], key[2])
+            actions.append(slot[1])
+            slot[0] = now + self.interval(route)
+            slot[1] = None
+            self.forwarded[route] += 1
+        return actions
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    if self.heap:
+                        wait = self.heap[0][0] - monotonic()
+                        if wait <= 0:
+                            break
+                        self.cond.wait(wait)
+                    else:
+                        self.cond.wait()
+                if not self.running:
+                    return
+                now = monotonic()
+                due = []
+                while self.heap and self.heap[0][0] <= now:
+                    due.append(heapq.heappop(self.heap))
+                actions = self._take(due, now)
+            for action in actions:
+                action()
+
+    def report(self):
+        for route in sorted(self.forwarded, key=str):
+            forwarded = self.forwarded[route]
+            dropped = self.dropped[route]
+            total = forwarded + dropped
+            name = route[0] if route[1] is None else f"{route[0]} {route[1]}"
+            print(f"{name}: {forwarded} forwarded, {dropped} dropped ({dropped / total:.0%})")
@@ -1,8 +1,8 @@
 from music21 import chord, duration, note, stream
-from pychord import Chord as Pychord
 from random_rhythms import Rhythm
 from chord_progression_network import Generator
 from music_bassline_generator import Bassline
+import chord_cache
 
 r1 = Rhythm(durations=[1, 3/2, 2, 3, 4])
 motifs1 = [ r1.motif() for _ in range(4) ]
@@ -61,8 +61,7 @@ for _ in range(4):
         phrase = g1.generate()
         for i, d in enumerate(m):
             bass.append(phrase[i])
-            c = Pychord(phrase[i])
-            c = chord.Chord(c.components())
+            c = chord.Chord(chord_cache.components(phrase[i]))
             c.duration = duration.Duration(d)
             chord_part.append(c)
 
@@ -80,8 +79,7 @@ for _ in range(4):
         phrase = g2.generate()
         for i, d in enumerate(m):
             bass.append(phrase[i])
-            c = Pychord(phrase[i])
-            c = chord.Chord(c.components())
+            c = chord.Chord(chord_cache.components(phrase[i]))
             c.duration = duration.Duration(d)
             chord_part.append(c)
 
@@ -99,8 +97,7 @@ for _ in range(4):
         phrase = g1.generate()
         for i, d in enumerate(m):
             bass.append(phrase[i])
-            c = Pychord(phrase[i])
-            c = chord.Chord(c.components())
+            c = chord.Chord(chord_cache.components(phrase[i]))
             c.duration = duration.Duration(d)
             chord_part.append(c)
 
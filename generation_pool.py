@@ -0,0 +1,96 @@
+"""
+Run the voices' phrase generation in worker processes
+
+usage:
+  def bass_voice(factor):
+      bass = Bassline(modal=True) # built in the worker
+      def phrase():
+          return [ (n, factor) for n in bass.generate('C', 4) ]
+      return phrase
+
+  pool = GenerationPool() # before opening ports and starting threads
+  pool.add('bass', bass_voice, 1)
+  future = pool.submit('bass')
+  notes = pool.result(future) # [ (note, duration), ... ]
+  pool.shutdown()
+  pool.report()
+"""
+import multiprocessing
+import random
+import signal
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from clock_stats import Histogram
+
+_phrases = {} # the worker's phrase function per voice
+
+def _init():
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # the parent decides when to stop
+    random.seed() # workers would otherwise all share one sequence
+
+def _setup(name, setup, args):
+    _phrases[name] = setup(*args)
+
+def _generate(name):
+    start = perf_counter()
+    notes = _phrases[name]()
+    return (
+        array('h', [ n for n, _ in notes ]),
+        array('d', [ d for _, d in notes ]),
+        (perf_counter() - start) * 1e6,
+    )
+
+class GenerationPool(object):
+    """
+    A fixed number of worker processes, one by default, shared by all the
+    voices. Each voice is assigned to one worker, where setup(*args) runs
+    once and returns the voice's phrase function, so the Generator,
+    Bassline and Device objects, and their state from phrase to phrase,
+    live in that process. Phrases come back as note and duration arrays,
+    and the CPU work never holds the GIL that the clock and player
+    threads need. Each worker costs one process and two parent threads,
+    however many voices it serves. Workers are started with start_method
+    ('spawn' by default), so setup must be a module-level function.
+    """
+    def __init__(self, workers=1, start_method='spawn'):
+        context = multiprocessing.get_context(start_method)
+        # one single-process executor per worker runs its voices' tasks in order
+        self.executors = [ ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init) for _ in range(workers) ]
+        self.voices = {} # name: executor
+        self.setups = {} # name: the setup future, until the first phrase is submitted
+        self.times = {} # microseconds of generation per phrase, per voice
+
+    def add(self, name, setup, *args):
+        executor = self.executors[len(self.voices) % len(self.executors)]
+        self.voices[name] = executor
+        self.setups[name] = executor.submit(_setup, name, setup, args)
+        self.times[name] = Histogram()
+
+    def submit(self, name):
+        """Start generating the voice's next phrase; returns a Future"""
+        setup = self.setups.pop(name, None)
+        if setup is not None:
+            setup.result() # raise a setup error here rather than as a missing voice
+        future = self.voices[name].submit(_generate, name)
+        future.voice = name
+        return future
+
+    def result(self, future):
+        """Wait for a submitted phrase and return it as (note, duration) pairs"""
+        notes, durations, elapsed = future.result()
+        self.times[future.voice].record(elapsed)
+        return list(zip(notes, durations))
+
+    def generator(self, name):
+        """A blocking phrase function for the voice, e.g. for a PhraseBuffer"""
+        return lambda: self.result(self.submit(name))
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def report(self):
+        for name, times in self.times.items():
+            t = times.summary()
+            print(f"{name} generation: {t['count']} phrases, p50 {t['p50']}us, p99 {t['p99']}us, max {t['max']}us")
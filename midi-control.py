@@ -1,56 +1,161 @@
 import mido # also install python-rtmidi
+import contextlib
 import os
 import re
 import sys
 import time
 import yaml
+from midi_bytes import MessageCache
+from note_scheduler import NoteScheduler
+from clock_stats import Histogram
+from coalescer import Coalescer
+from route_trace import RouteTrace
+import midi_input
 
 # https://mido.readthedocs.io/en/latest/message_types.html
-def send_to(outport, mtype, patch=0, data=0, channel=0, velocity=100):
+# with a scheduler, a timed note's note_off is queued instead of slept for
+def send_to(messages, mtype, patch=0, data=0, channel=0, velocity=100, scheduler=None):
     if mtype == 'start' or mtype == 'stop':
-        msg = mido.Message(mtype)
-        print(f"Out: {msg}")
-        outport.send(msg)
+        msg = messages.send(mtype)
+        print(f"Out: {messages.label(msg)}")
     elif mtype == 'control_change':
-        msg = mido.Message(mtype, control=patch, value=data, channel=channel)
-        print(f"Out: {msg}")
-        outport.send(msg)
+        msg = messages.send(mtype, channel, patch, data)
+        print(f"Out: {messages.label(msg)}")
     elif mtype == 'pitchwheel':
-        msg = mido.Message(mtype, pitch=data, channel=channel)
-        print(f"Out: {msg}")
-        outport.send(msg)
+        msg = messages.send(mtype, channel, data)
+        print(f"Out: {messages.label(msg)}")
     elif mtype == 'program_change':
-        msg = mido.Message(mtype, program=patch, channel=channel)
-        print(f"Out: {msg}")
-        outport.send(msg)
+        msg = messages.send(mtype, channel, patch)
+        print(f"Out: {messages.label(msg)}")
     else:
-        msg = mido.Message('note_on', note=patch, velocity=velocity, channel=channel)
-        print(f"Out: {msg}")
-        outport.send(msg)
+        msg = messages.send('note_on', channel, patch, velocity)
+        print(f"Out: {messages.label(msg)}")
+        if scheduler:
+            msg = mido.Message('note_off', note=patch, velocity=velocity, channel=channel)
+            scheduler.send_at(time.monotonic() + data, messages.port, msg)
+            print(f"Out: {msg} in {data}s")
+            return
         time.sleep(data)
-        msg = mido.Message('note_off', note=patch, velocity=velocity, channel=channel)
-        print(f"Out: {msg}")
-        outport.send(msg)
+        msg = messages.send('note_off', channel, patch, velocity)
+        print(f"Out: {messages.label(msg)}")
 
 # data arg keys: type (required), cmd (required), note, control, target, data
-def dispatch(port, msg, data):
+# walks every entry per message; the reference for compile_routes() and the benchmark
+def dispatch(messages, msg, data):
     for m in data['messages']:
         if msg.type == m['type']:
             if m['type'] == 'note_on' and m['cmd'] == 'control_change' and msg.note == m['note']:
-                send_to(port, m['cmd'], patch=m['target'], data=m['data'])
+                send_to(messages, m['cmd'], patch=m['target'], data=m['data'])
             elif m['type'] == 'note_on' and msg.note == m['note']:
-                send_to(port, m['cmd'])
+                send_to(messages, m['cmd'])
             elif m['type'] == 'control_change' and m['cmd'] == 'program_change' and msg.control == m['control']:
-                send_to(port, 'program_change', patch=msg.value)
+                send_to(messages, 'program_change', patch=msg.value)
             elif m['type'] == 'control_change' and msg.control == m['control'] and 'data' in m:
-                send_to(port, 'control_change', patch=m['target'], data=m['data'])
+                send_to(messages, 'control_change', patch=m['target'], data=m['data'])
             elif m['type'] == 'control_change' and msg.control == m['control']:
-                send_to(port, 'control_change', patch=m['target'], data=msg.value)
+                send_to(messages, 'control_change', patch=m['target'], data=msg.value)
             elif m['type'] == 'pitchwheel' and m['cmd'] == 'control_change':
                 scaled_result = scale_number(msg.pitch, -8192, 8192, 0, 127)
-                send_to(port, 'control_change', patch=m['target'], data=scaled_result)
+                send_to(messages, 'control_change', patch=m['target'], data=scaled_result)
             elif m['type'] == 'pitchwheel':
-                send_to(port, 'pitchwheel', data=msg.pitch)
+                send_to(messages, 'pitchwheel', data=msg.pitch)
+
+# the incoming message field each entry type is keyed on
+ROUTE_FIELDS = {
+    'note_on': 'note',
+    'control_change': 'control',
+}
+
+def compile_routes(messages, data, scheduler=None):
+    """
+    Compile data['messages'] into a dict of (type, note or control) to the
+    list of actions for it, in YAML order, with the same branch per entry
+    as dispatch(). Each action takes the incoming message. Timed notes
+    are ended by scheduler, if given, so an action never blocks.
+    """
+    routes = {}
+    for m in data['messages']:
+        field = ROUTE_FIELDS.get(m['type'])
+        if field is not None:
+            key = (m['type'], m[field])
+        elif m['type'] == 'pitchwheel':
+            key = ('pitchwheel', None)
+        else:
+            continue # dispatch() has no branch for the type
+        if m['type'] == 'note_on' and m['cmd'] == 'control_change':
+            action = lambda msg, m=m: send_to(messages, m['cmd'], patch=m['target'], data=m['data'])
+        elif m['type'] == 'note_on':
+            action = lambda msg, m=m: send_to(messages, m['cmd'], scheduler=scheduler)
+        elif m['type'] == 'control_change' and m['cmd'] == 'program_change':
+            action = lambda msg: send_to(messages, 'program_change', patch=msg.value)
+        elif m['type'] == 'control_change' and 'data' in m:
+            action = lambda msg, m=m: send_to(messages, 'control_change', patch=m['target'], data=m['data'])
+        elif m['type'] == 'control_change':
+            action = lambda msg, m=m: send_to(messages, 'control_change', patch=m['target'], data=msg.value)
+        elif m['cmd'] == 'control_change':
+            action = lambda msg, m=m: send_to(messages, 'control_change', patch=m['target'], data=scale_number(msg.pitch, -8192, 8192, 0, 127))
+        else:
+            action = lambda msg: send_to(messages, 'pitchwheel', data=msg.pitch)
+        routes.setdefault(key, []).append(action)
+    return routes
+
+def route(routes, msg, trace=None, received=None):
+    """
+    Run the compiled actions for msg; one dict lookup per message. With a
+    RouteTrace, each action is timed from received, the input time.
+    """
+    field = ROUTE_FIELDS.get(msg.type)
+    key = (msg.type, getattr(msg, field) if field else None)
+    for action in routes.get(key, ()):
+        if trace:
+            dispatched = time.monotonic()
+            action(msg)
+            trace.record(f"{key[0]} {key[1]}" if field else key[0], received, dispatched, time.monotonic())
+        else:
+            action(msg)
+
+def compile_coalescer(data):
+    """
+    A Coalescer for the map's top-level coalesce rate (messages per second
+    per controller) and per-entry rate overrides, or None if it sets neither
+    """
+    rates = {}
+    for m in data['messages']:
+        if 'rate' in m:
+            rates[(m['type'], m['control'] if m['type'] == 'control_change' else None)] = m['rate']
+    if 'coalesce' not in data and not rates:
+        return None
+    return Coalescer(rate=data.get('coalesce', 0), rates=rates)
+
+def bench(data, count):
+    """Routed messages per second, dispatch() versus the compiled routes"""
+    class NullPort(object):
+        def send(self, msg):
+            pass
+
+    inputs = [] # one matching message per entry, and one that matches nothing
+    for m in data['messages']:
+        if m['type'] == 'note_on':
+            inputs.append(mido.Message('note_on', note=m['note'], velocity=100))
+        elif m['type'] == 'control_change':
+            inputs.append(mido.Message('control_change', control=m['control'], value=64))
+        elif m['type'] == 'pitchwheel':
+            inputs.append(mido.Message('pitchwheel', pitch=1024))
+    inputs.append(mido.Message('control_change', control=127, value=0))
+    messages = MessageCache(NullPort())
+    routes = compile_routes(messages, data)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull): # both print each send
+        start = time.perf_counter()
+        for i in range(count):
+            dispatch(messages, inputs[i % len(inputs)], data)
+        before = count / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for i in range(count):
+            route(routes, inputs[i % len(inputs)])
+        after = count / (time.perf_counter() - start)
+    print(f"{len(data['messages'])} entries, {len(routes)} routes")
+    print(f"dispatch(): {before:,.0f} messages/s")
+    print(f"compiled:   {after:,.0f} messages/s ({after / before:.1f}x)")
 
 def scale_number(value, original_min, original_max, target_min, target_max):
     """
@@ -72,6 +177,8 @@ def scale_number(value, original_min, original_max, target_min, target_max):
 
 if __name__ == "__main__":
     device_file = sys.argv[1] if len(sys.argv) > 1 else sys.argv[0]
+    # messages to benchmark the dispatch with, instead of routing: python midi-control.py device.yaml 100000
+    bench_count = int(sys.argv[2]) if len(sys.argv) > 2 else 0
 
     match = re.search(r'^(.+?)\.py$', device_file)
     if match:
@@ -86,17 +193,60 @@ if __name__ == "__main__":
         in_port_name = data['controller']
         out_port_name = data['device']
 
+    if bench_count:
+        bench(data, bench_count)
+        sys.exit()
+
+    # sends the note_offs of timed notes, so routing never waits on one
+    scheduler = NoteScheduler()
+    latency = Histogram() # microseconds from receiving a message to routing it
+    depth = Histogram() # scheduler events pending when each message arrives
+    # holds back all but the latest CC or pitchwheel value per time slice
+    coalescer = compile_coalescer(data)
+    # receive, dispatch and send times per route, when $ROUTE_TRACE names a file
+    trace = RouteTrace('midi-control')
+    tracing = trace if trace.enabled else None
+
     try:
-        with mido.open_input(in_port_name) as inport:
-            print('Listening to:', inport.name)
-            with mido.open_output(out_port_name) as outport:
-                print('Sending to:', outport.name)
-                for msg in inport:
-                    if msg.type == 'clock':
-                        continue
-                    print(f"In: {msg}")
-                    dispatch(outport, msg, data)
+        with mido.open_output(out_port_name) as outport:
+            print('Sending to:', outport.name)
+            messages = MessageCache(outport) # encoded once per distinct message
+            routes = compile_routes(messages, data, scheduler)
+
+            def handle(msg):
+                received = time.monotonic()
+                depth.record(scheduler.depth)
+                print(f"In: {msg}")
+                if coalescer and coalescer.coalesces(msg):
+                    coalescer.submit(msg, lambda: route(routes, msg, tracing, received))
+                else:
+                    route(routes, msg, tracing, received)
+                latency.record((time.monotonic() - received) * 1e6)
+
+            scheduler.start()
+            trace.start()
+            if coalescer:
+                coalescer.start()
+            try:
+                # clock, active sensing and sysex are dropped before they reach python
+                with midi_input.open_input(in_port_name, handle) as inport:
+                    print('Listening to:', inport.name)
+                    while True:
+                        time.sleep(1) # the input's callback does the routing
+            finally:
+                if coalescer:
+                    coalescer.stop() # sends the values still held back
+                scheduler.stop() # sends the note_offs still pending
+                trace.stop()
     except KeyboardInterrupt:
         print('Stopping MIDI I/O.')
+        late = latency.summary()
+        queued = depth.summary()
+        print(f"Input to output: {late['count']} messages, p50 {late['p50']}us, p99 {late['p99']}us, max {late['max']}us")
+        print(f"Pending note_offs per input: p50 {queued['p50']}, max {queued['max']}")
+        scheduler.report()
+        if coalescer:
+            coalescer.report()
+        trace.report()
     except Exception as e:
         print(f"ERROR: {e}")
\ No newline at end of file
@@ -1,49 +1,11 @@
 import mido
 import time
 import threading
-from music21 import pitch
 from chord_progression_network import Generator
 from music_melodicdevice import Device
-
-bpm = 100
-velocity = 100
-transitions = [ 1 for _ in range(1, 7) ] + [0] # anything but the 7th
-g = Generator(
-    max=4 * 1, # beats x measures
-    tonic=False,
-    resolve=False,
-    chord_map=[''] * 7, # or '', 'm', '7', etc.
-    weights={
-            1: transitions,
-            2: transitions,
-            3: transitions,
-            4: transitions,
-            5: transitions,
-            6: transitions,
-            7: transitions,
-    },
-    verbose=False,
-)
-device = Device(verbose=False)
-# signal the note_stream thread on each clock tick
-clock_tick_event = threading.Event()
-# counter to track clock ticks (24 per beat)
-clock_tick_count = 0
-# number of clock ticks per beat
-CLOCKS_PER_BEAT = 24
-stop_threads = False
-# time between clock messages at 24 PPQN per beat
-interval = 60 / (bpm * 24)
-
-def midi_clock_thread():
-    global interval, stop_threads, clock_tick_event, clock_tick_count
-    while not stop_threads:
-        outport.send(mido.Message('clock'))
-        clock_tick_count += 1
-        # signal note_stream thread every beat
-        if clock_tick_count % CLOCKS_PER_BEAT == 0:
-            clock_tick_event.set()
-        time.sleep(interval)
+from clock_stats import ClockStats
+from clock_process import ClockProcess
+import pitch_table
 
 def note_stream_thread():
     global g, device, velocity, stop_threads, clock_tick_event
@@ -55,7 +17,7 @@ def note_stream_thread():
         for ph in phrase:
             arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
             for a in arped:
-                p = pitch.Pitch(a[1]).midi
+                p = pitch_table.midi(a[1])
                 msg_on = mido.Message('note_on', note=p, velocity=velocity)
                 outport.send(msg_on)
                 time.sleep(a[0])
@@ -63,11 +25,39 @@ def note_stream_thread():
                 outport.send(msg_off)
 
 if __name__ == "__main__":
+    # set up here, not at import, so the spawned clock process skips it
+    bpm = 100
+    velocity = 100
+    transitions = [ 1 for _ in range(1, 7) ] + [0] # anything but the 7th
+    g = Generator(
+        max=4 * 1, # beats x measures
+        tonic=False,
+        resolve=False,
+        chord_map=[''] * 7, # or '', 'm', '7', etc.
+        weights={
+                1: transitions,
+                2: transitions,
+                3: transitions,
+                4: transitions,
+                5: transitions,
+                6: transitions,
+                7: transitions,
+        },
+        verbose=False,
+    )
+    device = Device(verbose=False)
+    # signal the note_stream thread on each clock tick
+    clock_tick_event = threading.Event()
+    # number of clock ticks per beat
+    CLOCKS_PER_BEAT = 24
+    stop_threads = False
+    stats = ClockStats('midi-thread-1', bpm, CLOCKS_PER_BEAT)
+
     with mido.open_output('USB MIDI Interface') as outport:
         print(outport)
-        clock_thread = threading.Thread(target=midi_clock_thread, daemon=True) # daemon = stops when main thread exits
+        clock = ClockProcess(outport.name, bpm, CLOCKS_PER_BEAT, on_beat=clock_tick_event.set, stats=stats)
         note_thread = threading.Thread(target=note_stream_thread, daemon=True)
-        clock_thread.start()
+        clock.start()
         note_thread.start()
         outport.send(mido.Message('start'))
         try:
@@ -77,9 +67,10 @@ if __name__ == "__main__":
             outport.send(mido.Message('stop'))
             print("\nSignaling threads to stop...")
             stop_threads = True
-            clock_thread.join()
+            clock.stop()
             note_thread.join()
             print("All threads stopped.")
+            stats.report()
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
         finally:
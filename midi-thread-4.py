@@ -1,73 +1,92 @@
 # This program is for driving a multi-timbral synth, like a Waldorf, or fluidsynth
 # ex: > fluidsynth -a coreaudio -m coremidi -g 2.0 ~/Music/soundfont/FluidR3_GM.sf2
-#     > python midi-thread-4.py 'FluidSynth virtual port (15609)'
+#     > python midi-thread-4.py 'FluidSynth virtual port (15609)' [factor] [phrase lookahead depth] [sleep|grid]
 
 import sys
 import random
 import time
 import threading
 import mido
-from music21 import pitch
 from chord_progression_network import Generator
 from music_melodicdevice import Device
 from random_rhythms import Rhythm
 from music_bassline_generator import Bassline
+from clock_stats import ClockStats
+from clock_process import ClockProcess
+from phrase_buffer import PhraseBuffer
+from note_scheduler import NoteScheduler
+import pitch_table
 
-def midi_clock_thread():
-    global interval, stop_threads, clock_tick_event, clock_tick_count
-    while not stop_threads:
-        outport.send(mido.Message('clock'))
-        clock_tick_count += 1
-        # signal note_stream thread every beat
-        if clock_tick_count % CLOCKS_PER_BEAT == 0:
-            clock_tick_event.set()
-        time.sleep(interval)
+def play_phrase(outport, channel, notes, start):
+    """Schedule (note, duration) pairs back to back from start and return when they end"""
+    global scheduler
+    for note, dura in notes:
+        scheduler.note(outport, channel, note, velo(), start, dura)
+        start += dura
+    return start
 
-def midi_message(outport, channel, note, dura):
-    v = velo()
-    msg = mido.Message('note_on', note=note, velocity=v, channel=channel)
-    outport.send(msg)
-    time.sleep(dura)
-    msg = mido.Message('note_off', note=note, velocity=v, channel=channel)
-    outport.send(msg)
+def play_phrase_on_grid(outport, channel, notes, start_tick):
+    """Schedule (note, beats) pairs at tick offsets from start_tick and return when they end"""
+    global scheduler, clock
+    position = 0.0 # ticks into the phrase
+    for note, beats in notes:
+        on = clock.tick_time(start_tick + round(position))
+        position += beats * CLOCKS_PER_BEAT
+        off = clock.tick_time(start_tick + round(position))
+        scheduler.note(outport, channel, note, velo(), on, off - on)
+    return clock.tick_time(start_tick + round(position))
 
-def note_stream_thread():
-    global g, device, factor, outport, velocity, stop_threads, clock_tick_event
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        msg = mido.Message('program_change', channel=0, program=91)
-        outport.send(msg)
-        phrase = g.generate()
-        transpose = chance()
-        motif = r.motif()
-        for ph in phrase:
-            arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
-            for i,d in enumerate(motif):
-                p = pitch.Pitch(arped[i % len(arped)][1]).midi
-                if transpose:
+def note_phrase():
+    global g, device, factor
+    phrase = g.generate()
+    transpose = chance()
+    motif = r.motif()
+    notes = []
+    for ph in phrase:
+        arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
+        for i,d in enumerate(motif):
+            p = pitch_table.midi(arped[i % len(arped)][1])
+            if transpose:
+                p -= 12
+                if chance():
                     p -= 12
-                    if chance():
-                        p -= 12
-                midi_message(outport, 0, p, d * factor)
+            notes.append((p, d * factor))
+    return notes
+
+def bass_phrase():
+    global bass, factor
+    note = random.choice(list(scale_map.keys()))
+    chord = note + scale_map[note]
+    bassline = bass.generate(chord, 4)
+    return [ (n, factor) for n in bassline ]
 
-def bass_stream_thread():
-    global bass, factor, outport, stop_threads, clock_tick_event
+def voice_stream_thread():
+    global outport, stop_threads, clock_tick_event, scheduler, voices, clock, timing
+    free = [0] * len(voices) # when each voice's last phrase ends
     while not stop_threads:
         clock_tick_event.wait() # wait for the next beat (PLL sync)
         clock_tick_event.clear()
-        msg = mido.Message('program_change', channel=1, program=43)
-        outport.send(msg)
-        note = random.choice(list(scale_map.keys()))
-        chord = note + scale_map[note]
-        bassline = bass.generate(chord, 4)
-        for n in bassline:
-            midi_message(outport, 1, n, factor)
+        now = time.monotonic()
+        for i, (channel, program, phrases) in enumerate(voices):
+            if free[i] > now:
+                continue # still playing
+            scheduler.send_at(now, outport, mido.Message('program_change', channel=channel, program=program))
+            notes = phrases.get() # generated ahead of the beat
+            if notes is None:
+                return
+            if timing == 'grid':
+                free[i] = play_phrase_on_grid(outport, channel, notes, clock.beats * CLOCKS_PER_BEAT)
+            else:
+                free[i] = play_phrase(outport, channel, notes, now)
 
 if __name__ == "__main__":
     port_name = sys.argv[1] if len(sys.argv) > 1 else 'USB MIDI Interface'
     # kludge: duration multiplier to slow down the pace of the notes
     factor = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    # phrases generated ahead per stream
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    # or 'grid': place the notes on the clock's ticks, counted from the phrase's beat
+    timing = sys.argv[4] if len(sys.argv) > 4 else 'sleep'
 
     bpm = 100 # for the clock
     velocity = 100
@@ -104,14 +123,18 @@ if __name__ == "__main__":
         tonic=False,
         resolve=False,
     )
-    # signal the note_stream thread on each clock tick
+    # signal the voice thread on each clock tick
     clock_tick_event = threading.Event()
-    # clock tick counter
-    clock_tick_count = 0
+    note_phrases = PhraseBuffer('note_stream', note_phrase, depth)
+    bass_phrases = PhraseBuffer('bass_stream', bass_phrase, depth)
+    # sends every voice's notes on time from one thread
+    scheduler = NoteScheduler()
+    voices = [ (0, 91, note_phrases), (1, 43, bass_phrases) ] # channel, program, phrases
     # clock ticks per beat
     CLOCKS_PER_BEAT = 24
     # time between clock messages at 24 PPQN per beat
     interval = 60 / (bpm * CLOCKS_PER_BEAT)
+    stats = ClockStats('midi-thread-4', bpm, CLOCKS_PER_BEAT)
     stop_threads = False
 
     chance = lambda: random.random() < 0.5
@@ -119,12 +142,13 @@ if __name__ == "__main__":
 
     with mido.open_output(port_name) as outport:
         print(outport)
-        clock_thread = threading.Thread(target=midi_clock_thread, daemon=True) # daemon = stops when main thread exits
-        note_thread = threading.Thread(target=note_stream_thread, daemon=True)
-        bass_thread = threading.Thread(target=bass_stream_thread, daemon=True)
-        clock_thread.start()
-        note_thread.start()
-        bass_thread.start()
+        clock = ClockProcess(outport.name, bpm, CLOCKS_PER_BEAT, on_beat=clock_tick_event.set, stats=stats)
+        voice_thread = threading.Thread(target=voice_stream_thread, daemon=True)
+        note_phrases.start()
+        bass_phrases.start()
+        scheduler.start()
+        clock.start()
+        voice_thread.start()
         outport.send(mido.Message('start'))
         try:
             while True:
@@ -133,10 +157,17 @@ if __name__ == "__main__":
             outport.send(mido.Message('stop'))
             print("\nSignaling threads to stop...")
             stop_threads = True
-            clock_thread.join()
-            note_thread.join()
-            bass_thread.join()
+            clock.stop()
+            clock_tick_event.set() # wake the voice thread so it sees stop_threads
+            voice_thread.join()
+            scheduler.stop()
+            note_phrases.stop()
+            bass_phrases.stop()
             print("All threads stopped.")
+            stats.report()
+            scheduler.report()
+            note_phrases.report()
+            bass_phrases.report()
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
         finally:
@@ -5,63 +5,61 @@ import random
 import time
 import threading
 import mido
-from music21 import pitch
 from chord_progression_network import Generator
 from music_melodicdevice import Device
 from random_rhythms import Rhythm
 from music_bassline_generator import Bassline
+from clock_stats import ClockStats
+from clock_process import ClockProcess
+from note_scheduler import NoteScheduler
+import pitch_table
 
-def midi_clock_thread():
-    global note_outport, bass_outport, interval, stop_threads, clock_tick_event, clock_tick_count
-    while not stop_threads:
-        note_outport.send(mido.Message('clock'))
-        bass_outport.send(mido.Message('clock'))
-        clock_tick_count += 1
-        # signal stream threads every beat
-        if clock_tick_count % CLOCKS_PER_BEAT == 0:
-            clock_tick_event.set()
-        time.sleep(interval)
-
-def midi_message(outport, channel, note, dura):
-    v = velo()
-    msg = mido.Message('note_on', note=note, velocity=v, channel=channel)
-    outport.send(msg)
-    time.sleep(dura)
-    msg = mido.Message('note_off', note=note, velocity=v, channel=channel)
-    outport.send(msg)
+def play_phrase(outport, channel, notes, start):
+    """Schedule (note, duration) pairs back to back from start and return when they end"""
+    global scheduler
+    for note, dura in notes:
+        scheduler.note(outport, channel, note, velo(), start, dura)
+        start += dura
+    return start
 
-def note_stream_thread():
-    global g, device, factor, note_outport, velocity, stop_threads, clock_tick_event
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=0, program=91)
-        # note_outport.send(msg)
-        phrase = g.generate()
-        transpose = chance()
-        motif = r.motif()
-        for ph in phrase:
-            arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
-            for i,d in enumerate(motif):
-                p = pitch.Pitch(arped[i % len(arped)][1]).midi
-                if transpose:
+def note_phrase():
+    global g, device, factor
+    phrase = g.generate()
+    transpose = chance()
+    motif = r.motif()
+    notes = []
+    for ph in phrase:
+        arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
+        for i,d in enumerate(motif):
+            p = pitch_table.midi(arped[i % len(arped)][1])
+            if transpose:
+                p -= 12
+                if chance():
                     p -= 12
-                    if chance():
-                        p -= 12
-                midi_message(note_outport, 0, p, d * factor)
+            notes.append((p, d * factor))
+    return notes
+
+def bass_phrase():
+    global bass, factor
+    note = random.choice(list(scale_map.keys()))
+    chord = note + scale_map[note]
+    bassline = bass.generate(chord, 4)
+    return [ (n, factor) for n in bassline ]
 
-def bass_stream_thread():
-    global bass, factor, bass_outport, stop_threads, clock_tick_event
+def voice_stream_thread():
+    global voices, stop_threads, clock_tick_event
+    for voice in voices:
+        voice['free'] = 0 # when the voice's last phrase ends
+        voice['next'] = voice['phrase']()
     while not stop_threads:
         clock_tick_event.wait() # wait for the next beat (PLL sync)
         clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=1, program=43)
-        # bass_outport.send(msg)
-        note = random.choice(list(scale_map.keys()))
-        chord = note + scale_map[note]
-        bassline = bass.generate(chord, 4)
-        for n in bassline:
-            midi_message(bass_outport, 0, n, factor)
+        now = time.monotonic()
+        started = [ voice for voice in voices if voice['free'] <= now ] # the rest are still playing
+        for voice in started: # schedule every downbeat before any generation delays the others
+            voice['free'] = play_phrase(voice['port'], voice['channel'], voice['next'], now)
+        for voice in started:
+            voice['next'] = voice['phrase']() # generate while this one plays
 
 if __name__ == "__main__":
     note_port_name = sys.argv[1] if len(sys.argv) > 1 else 'USB MIDI Interface'
@@ -108,12 +106,14 @@ if __name__ == "__main__":
         resolve=False,
     )
 
-    # signal the note_stream thread on each clock tick
+    # signal the voice thread on each clock tick
     clock_tick_event = threading.Event()
-    clock_tick_count = 0
+    # sends every voice's notes on time from one thread
+    scheduler = NoteScheduler()
     CLOCKS_PER_BEAT = 24
     bpm = 100 # for the clock
     interval = 60 / (bpm * CLOCKS_PER_BEAT) # time between clock messages at 24 PPQN per beat
+    stats = ClockStats('midi-thread-5', bpm, CLOCKS_PER_BEAT)
     stop_threads = False
 
     chance = lambda: random.random() < 0.5
@@ -122,22 +122,28 @@ if __name__ == "__main__":
     with mido.open_output(note_port_name) as note_outport, mido.open_output(bass_port_name) as bass_outport:
         print(note_outport)
         print(bass_outport)
-        clock_thread = threading.Thread(target=midi_clock_thread, daemon=True) # daemon = stops when main thread exits
-        note_thread = threading.Thread(target=note_stream_thread, daemon=True)
-        bass_thread = threading.Thread(target=bass_stream_thread, daemon=True)
-        clock_thread.start()
-        note_thread.start()
-        bass_thread.start()
+        clock = ClockProcess([note_outport.name, bass_outport.name], bpm, CLOCKS_PER_BEAT, on_beat=clock_tick_event.set, stats=stats)
+        voices = [
+            { 'port': note_outport, 'channel': 0, 'phrase': note_phrase },
+            { 'port': bass_outport, 'channel': 0, 'phrase': bass_phrase },
+        ]
+        voice_thread = threading.Thread(target=voice_stream_thread, daemon=True)
+        scheduler.start()
+        clock.start()
+        voice_thread.start()
         try:
             while True:
                 time.sleep(interval) # keep main thread alive and respond to interrupts
         except KeyboardInterrupt:
             print("\nSignaling threads to stop...")
             stop_threads = True
-            clock_thread.join()
-            note_thread.join()
-            bass_thread.join()
+            clock.stop()
+            clock_tick_event.set() # wake the voice thread so it sees stop_threads
+            voice_thread.join()
+            scheduler.stop()
             print("All threads stopped.")
+            stats.report()
+            scheduler.report()
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
         finally:
@@ -6,89 +6,101 @@ import random
 import time
 import threading
 import mido
-from music21 import pitch
 from chord_progression_network import Generator
 from music_melodicdevice import Device
 from random_rhythms import Rhythm
 from music_bassline_generator import Bassline
+from clock_stats import ClockStats
+from clock_process import ClockProcess
+from beat_bus import BeatBus
+from note_scheduler import NoteScheduler
+from generation_pool import GenerationPool
+import pitch_table
 
-def midi_clock_thread():
-    global interval, stop_threads, clock_tick_event, clock_tick_count
-    while not stop_threads:
-        outport.send(mido.Message('clock'))
-        clock_tick_count += 1
-        # signal arp_stream thread every beat
-        if clock_tick_count % CLOCKS_PER_BEAT == 0:
-            clock_tick_event.set()
-        time.sleep(interval)
+def play_phrase(outport, channel, notes, start):
+    """Schedule (note, duration) pairs back to back from start and return when they end"""
+    global scheduler
+    for note, dura in notes:
+        scheduler.note(outport, channel, note, velo(), start, dura)
+        start += dura
+    return start
 
-def midi_message(outport, channel, note, dura):
-    v = velo()
-    msg = mido.Message('note_on', note=note, velocity=v, channel=channel)
-    outport.send(msg)
-    time.sleep(dura)
-    msg = mido.Message('note_off', note=note, velocity=v, channel=channel)
-    outport.send(msg)
+def melody_voice(scale_map, factor):
+    """Build the melody generators in a generation worker and return its phrase function"""
+    size = len(scale_map) + 1
+    transitions = [ i for i in range(1, size) ]
+    weights = [ 1 for _ in range(1, size) ]
+    g = Generator(
+        scale_note='A',
+        scale_name='aeolian',
+        max=4 * 1, # beats x measures
+        tonic=False,
+        resolve=False,
+        scale=list(scale_map.keys()),
+        chord_map=list(scale_map.values()),
+        net={ i: transitions for i in range(1, size) },
+        weights={ i: weights for i in range(1, size) },
+        verbose=False,
+    )
+    device = Device(verbose=False)
+    r = Rhythm(
+        measure_size=1,
+        durations=[ 1/8, 1/4, 1/2, 1/3 ],
+        groups={ 1/3: 3 },
+    )
+    chance = lambda: random.random() < 0.5
 
-def stream0_thread_fn():
-    global g, device, factor, outport, velocity, stop_threads, clock_tick_event
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=0, program=91)
-        # outport.send(msg)
+    def phrase():
         phrase = g.generate()
         transpose = chance()
         motif = r.motif()
+        notes = []
         for ph in phrase:
             arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
             for i,d in enumerate(motif):
-                p = pitch.Pitch(arped[i % len(arped)][1]).midi
+                p = pitch_table.midi(arped[i % len(arped)][1])
                 if transpose:
                     p -= 12
                     if chance():
                         p -= 12
-                midi_message(outport, 0, p, d * factor)
+                notes.append((p, d * factor))
+        return notes
+    return phrase
 
-def stream1_thread_fn():
-    global bass, factor, outport, stop_threads, clock_tick_event
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=1, program=43)
-        # outport.send(msg)
-        note = random.choice(list(scale_map.keys()))
-        chord = note + scale_map[note]
-        bassline = bass.generate(chord, 4)
-        for n in bassline:
-            midi_message(outport, 1, n, factor)
+def bass_voice(scale_map, factor):
+    """Build a bassline generator in a generation worker and return its phrase function"""
+    bass = Bassline(
+        modal=True,
+        tonic=False,
+        resolve=False,
+    )
 
-def stream2_thread_fn():
-    global bass, factor, outport, stop_threads, clock_tick_event
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=2, program=43)
-        # outport.send(msg)
+    def phrase():
         note = random.choice(list(scale_map.keys()))
         chord = note + scale_map[note]
         bassline = bass.generate(chord, 4)
-        for n in bassline:
-            midi_message(outport, 2, n, factor)
-
+        return [ (n, factor) for n in bassline ]
+    return phrase
 
-def stream3_thread_fn():
-    global bass, factor, outport, stop_threads, clock_tick_event
+def voice_stream_thread():
+    global voices, stop_threads, bus, pool
+    beats = bus.subscribe('voices')
+    for voice in voices:
+        voice['free'] = 0 # when the voice's last phrase ends
+        voice['next'] = pool.submit(voice['name'])
+    for voice in voices:
+        voice['next'] = pool.result(voice['next'])
     while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=2, program=43)
-        # outport.send(msg)
-        note = random.choice(list(scale_map.keys()))
-        chord = note + scale_map[note]
-        bassline = bass.generate(chord, 4)
-        for n in bassline:
-            midi_message(outport, 3, n, factor)
+        if beats.wait() is None: # wait for the next beat
+            break
+        now = time.monotonic()
+        started = [ voice for voice in voices if voice['free'] <= now ] # the rest are still playing
+        for voice in started: # schedule every downbeat before waiting on any generation
+            voice['free'] = play_phrase(voice['port'], voice['channel'], voice['next'], now)
+        for voice in started:
+            voice['next'] = pool.submit(voice['name']) # generate while these play
+        for voice in started:
+            voice['next'] = pool.result(voice['next'])
 
 if __name__ == "__main__":
     port_name = sys.argv[1] if len(sys.argv) > 1 else 'MIDIThing2'
@@ -104,57 +116,38 @@ if __name__ == "__main__":
         'E': 'm',
         'G': '',
     }
-    size = len(scale_map) + 1
-    transitions = [ i for i in range(1, size) ]
-    weights = [ 1 for _ in range(1, size) ]
-    g = Generator(
-        scale_note='A',
-        scale_name='aeolian',
-        max=4 * 1, # beats x measures
-        tonic=False,
-        resolve=False,
-        scale=list(scale_map.keys()),
-        chord_map=list(scale_map.values()),
-        net={ i: transitions for i in range(1, size) },
-        weights={ i: weights for i in range(1, size) },
-        verbose=False,
-    )
-    device = Device(verbose=False)
-    r = Rhythm(
-        measure_size=1,
-        durations=[ 1/8, 1/4, 1/2, 1/3 ],
-        groups={ 1/3: 3 },
-    )
-    bass = Bassline(
-        modal=True,
-        tonic=False,
-        resolve=False,
-    )
-    # signal the arp_stream thread on each clock tick
-    clock_tick_event = threading.Event()
-    # clock tick counter
-    clock_tick_count = 0
+    # the voices generate their phrases in a worker process, started before the ports are opened
+    pool = GenerationPool()
+    pool.add('stream0', melody_voice, scale_map, factor)
+    pool.add('stream1', bass_voice, scale_map, factor)
+    pool.add('stream2', bass_voice, scale_map, factor)
+    pool.add('stream3', bass_voice, scale_map, factor)
+    # broadcast each beat to the voice thread
+    bus = BeatBus()
+    # sends every voice's notes on time from one thread
+    scheduler = NoteScheduler()
     # clock ticks per beat
     CLOCKS_PER_BEAT = 24
     # time between clock messages at 24 PPQN per beat
     interval = 60 / (bpm * CLOCKS_PER_BEAT)
+    stats = ClockStats('midi-thread-6', bpm, CLOCKS_PER_BEAT)
     stop_threads = False
 
-    chance = lambda: random.random() < 0.5
     velo = lambda: velocity + random.randint(-10, 10)
 
     with mido.open_output(port_name) as outport:
         print(outport)
-        clock_thread = threading.Thread(target=midi_clock_thread, daemon=True) # daemon = stops when main thread exits
-        stream0_thread = threading.Thread(target=stream0_thread_fn, daemon=True)
-        stream1_thread = threading.Thread(target=stream1_thread_fn, daemon=True)
-        stream2_thread = threading.Thread(target=stream2_thread_fn, daemon=True)
-        stream3_thread = threading.Thread(target=stream3_thread_fn, daemon=True)
-        clock_thread.start()
-        stream0_thread.start()
-        stream1_thread.start()
-        stream2_thread.start()
-        stream3_thread.start()
+        clock = ClockProcess(outport.name, bpm, CLOCKS_PER_BEAT, on_beat=bus.publish, stats=stats)
+        voices = [
+            { 'name': 'stream0', 'port': outport, 'channel': 0 },
+            { 'name': 'stream1', 'port': outport, 'channel': 1 },
+            { 'name': 'stream2', 'port': outport, 'channel': 2 },
+            { 'name': 'stream3', 'port': outport, 'channel': 3 },
+        ]
+        voice_thread = threading.Thread(target=voice_stream_thread, daemon=True)
+        scheduler.start()
+        clock.start()
+        voice_thread.start()
         outport.send(mido.Message('start'))
         try:
             while True:
@@ -163,12 +156,16 @@ if __name__ == "__main__":
             outport.send(mido.Message('stop'))
             print("\nSignaling threads to stop...")
             stop_threads = True
-            clock_thread.join()
-            stream0_thread.join()
-            stream1_thread.join()
-            stream2_thread.join()
-            stream3_thread.join()
+            clock.stop()
+            bus.close()
+            voice_thread.join()
+            scheduler.stop()
+            pool.shutdown()
             print("All threads stopped.")
+            stats.report()
+            bus.report()
+            scheduler.report()
+            pool.report()
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
         finally:
@@ -6,91 +6,94 @@ import random
 import time
 import threading
 import mido
-import pychord
-from music21 import pitch
 from chord_progression_network import Generator
 from music_melodicdevice import Device
 from random_rhythms import Rhythm
 from music_bassline_generator import Bassline
+from clock_stats import ClockStats
+from clock_process import ClockProcess
+from midi_clock import Grid
+import pitch_table
+import chord_cache
+from midi_bytes import MessageCache
+from note_tracker import NoteTracker
 
-def midi_clock_thread():
-    global synth1_outport, synth2_outport, interval, stop_threads, clock_tick_event, clock_tick_count
-    while not stop_threads:
-        synth1_outport.send(mido.Message('clock'))
-        synth2_outport.send(mido.Message('clock'))
-        clock_tick_count += 1
-        # signal stream threads every beat
-        if clock_tick_count % clocks_per_beat == 0:
-            clock_tick_event.set()
-        time.sleep(interval)
-
-def midi_message(outport, note, channel=0, dura=1):
+def midi_message(messages, note, channel=0, dura=1, pause=time.sleep):
     v = velo()
-    msg = mido.Message('note_on', note=note, velocity=v, channel=channel)
-    outport.send(msg)
-    time.sleep(dura)
-    msg = mido.Message('note_off', note=note, velocity=v, channel=channel)
-    outport.send(msg)
+    messages.send('note_on', channel, note, v)
+    pause(dura)
+    messages.send('note_off', channel, note, v)
 
-def midi_messages(outport, notes, channel=0, dura=1):
+def midi_messages(messages, notes, channel=0, dura=1, pause=time.sleep):
     v = velo()
-    for note in notes:
-        p = pitch.Pitch(note).midi
-        msg = mido.Message('note_on', note=p, velocity=v, channel=channel)
-        outport.send(msg)
-    time.sleep(dura)
-    for note in notes:
-        p = pitch.Pitch(note).midi
-        msg = mido.Message('note_off', note=p, velocity=v, channel=channel)
-        outport.send(msg)
+    notes = [ pitch_table.midi(note) for note in notes ]
+    messages.send_all('note_on', channel, [ (p, v) for p in notes ]) # the whole chord in one batch
+    pause(dura)
+    messages.send_all('note_off', channel, [ (p, v) for p in notes ])
 
 def synth2_stream_thread(program=44, bank=None, prog=None):
-    global g, bass, factor, synth2_outport, stop_threads, clock_tick_event
-    if program is None:
-        program = int(str(bank - 1) + str(prog - 1), 8) # 8x8 bank x program
-    msg = mido.Message('program_change', channel=1, program=program)
-    synth2_outport.send(msg)
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        note = random.choice(g.scale)
-        p = pitch.Pitch(note).name
-        chord = p + scale_map[p]
-        bassline = bass.generate(chord, 4)
-        for n in bassline:
-            midi_message(synth2_outport, n, 1, factor)
+    global g, bass, factor, synth2_outport, synth2_messages, stop_threads, clock_tick_event, synth2_grid, tracker
+    try:
+        pause = synth2_grid.sleep if synth2_grid else time.sleep
+        if program is None:
+            program = int(str(bank - 1) + str(prog - 1), 8) # 8x8 bank x program
+        msg = mido.Message('program_change', channel=1, program=program)
+        synth2_outport.send(msg)
+        while not stop_threads:
+            clock_tick_event.wait() # wait for the next beat (PLL sync)
+            clock_tick_event.clear()
+            if synth2_grid:
+                synth2_grid.phrase() # count the steps from this beat
+            note = random.choice(g.scale)
+            p = pitch_table.name(note)
+            chord = p + scale_map[p]
+            bassline = bass.generate(chord, 4)
+            for n in bassline:
+                if stop_threads:
+                    return
+                midi_message(synth2_messages, n, 1, factor, pause)
+    finally:
+        tracker.release(synth2_outport) # only this thread's notes, however it ends
 
 def synth1_stream_thread(program=None, bank=6, prog=8):
-    global default_quality, default_scale, default_scale_map, g, device, factor, synth1_outport, velocity, stop_threads, clock_tick_event
-    if program is None:
-        program = int(str(bank - 1) + str(prog - 1), 8) # 8x8 bank x program
-    msg = mido.Message('program_change', channel=0, program=program)
-    synth1_outport.send(msg)
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        phrase = g.generate()
-        motif = r.motif()
-        for ph in phrase:
-            arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
-            for i,d in enumerate(motif):
-                p = pitch.Pitch(arped[i % len(arped)][1]).name
-                quality = default_quality
-                try:
-                    i = g.scale.index(p)
-                    quality = g.chord_map[i]
-                except ValueError:
-                    pass
-                c = p + quality
-                c = pychord.Chord(c)
-                c = c.components_with_pitch(root_pitch=4)
-                midi_messages(synth1_outport, c, 0, d * factor)
+    global default_quality, default_scale, default_scale_map, g, device, factor, synth1_outport, synth1_messages, velocity, stop_threads, clock_tick_event, synth1_grid, tracker
+    try:
+        pause = synth1_grid.sleep if synth1_grid else time.sleep
+        if program is None:
+            program = int(str(bank - 1) + str(prog - 1), 8) # 8x8 bank x program
+        msg = mido.Message('program_change', channel=0, program=program)
+        synth1_outport.send(msg)
+        while not stop_threads:
+            clock_tick_event.wait() # wait for the next beat (PLL sync)
+            clock_tick_event.clear()
+            if synth1_grid:
+                synth1_grid.phrase() # count the steps from this beat
+            phrase = g.generate()
+            motif = r.motif()
+            for ph in phrase:
+                arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
+                for i,d in enumerate(motif):
+                    if stop_threads:
+                        return
+                    p = pitch_table.name(arped[i % len(arped)][1])
+                    quality = default_quality
+                    try:
+                        i = g.scale.index(p)
+                        quality = g.chord_map[i]
+                    except ValueError:
+                        pass
+                    c = p + quality
+                    c = chord_cache.midi_notes(c, 4)
+                    midi_messages(synth1_messages, c, 0, d * factor, pause)
+    finally:
+        tracker.release(synth1_outport) # only this thread's notes, however it ends
 
 if __name__ == "__main__":
     synth1_port_name = sys.argv[1]      if len(sys.argv) > 1 else 'USB MIDI Interface'
     synth2_port_name = sys.argv[2]      if len(sys.argv) > 2 else 'SE-02'
     factor           = int(sys.argv[3]) if len(sys.argv) > 3 else 32
     default_quality  = sys.argv[4]      if len(sys.argv) > 4 else 'm' # minor
+    timing           = sys.argv[5]      if len(sys.argv) > 5 else 'sleep' # or 'grid': play the steps on the clock's ticks
 
     g = Generator(
         octave=4,
@@ -138,10 +141,10 @@ if __name__ == "__main__":
 
     # signal the synth1_stream thread on each clock tick
     clock_tick_event = threading.Event()
-    clock_tick_count = 0
     bpm = 100 # for the clock
     clocks_per_beat = 24
     interval = 60 / (bpm * clocks_per_beat) # time between clock messages at 24 PPQN per beat
+    stats = ClockStats('midi-thread-7', bpm, clocks_per_beat)
     stop_threads = False
     velocity = 100
 
@@ -150,10 +153,15 @@ if __name__ == "__main__":
 
     with mido.open_output(synth1_port_name) as synth1_outport, mido.open_output(synth2_port_name) as synth2_outport:
         print(synth1_outport, synth2_outport)
-        clock_thread = threading.Thread(target=midi_clock_thread, daemon=True) # daemon = stops when main thread exits
+        tracker = NoteTracker() # sounding notes, released on stop
+        synth1_messages = MessageCache(synth1_outport, tracker=tracker)
+        synth2_messages = MessageCache(synth2_outport, tracker=tracker)
+        clock = ClockProcess([synth1_outport.name, synth2_outport.name], bpm, clocks_per_beat, on_beat=clock_tick_event.set, stats=stats)
+        synth1_grid = Grid(clock) if timing == 'grid' else None
+        synth2_grid = Grid(clock) if timing == 'grid' else None
         synth1_thread = threading.Thread(target=synth1_stream_thread, daemon=True)
         synth2_thread = threading.Thread(target=synth2_stream_thread, daemon=True)
-        clock_thread.start()
+        clock.start()
         synth1_thread.start()
         synth2_thread.start()
         try:
@@ -162,12 +170,21 @@ if __name__ == "__main__":
         except KeyboardInterrupt:
             print("\nSignaling threads to stop...")
             stop_threads = True
-            clock_thread.join()
-            synth1_thread.join()
-            synth2_thread.join()
+            clock.stop()
+            clock_tick_event.set() # wake the threads waiting for a beat
+            tracker.release() # silence the notes now, not after the current step
+            synth1_thread.join(timeout=1)
+            synth2_thread.join(timeout=1)
             print("All threads stopped.")
+            stats.report()
+            if timing == 'grid':
+                synth1_grid.report('synth1_stream')
+                synth2_grid.report('synth2_stream')
+            chord_cache.report()
+            tracker.report()
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            tracker.release()
         finally:
             synth1_outport.close()
             synth2_outport.close()
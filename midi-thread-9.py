@@ -6,80 +6,78 @@ import random
 import time
 import threading
 import mido
-import pychord
-from music21 import pitch
 from chord_progression_network import Generator
 from music_melodicdevice import Device
 from random_rhythms import Rhythm
+from clock_stats import ClockStats
+from clock_process import ClockProcess
+from midi_clock import Grid
+import pitch_table
+import chord_cache
+from midi_bytes import MessageCache
+from note_tracker import NoteTracker
 
-def midi_clock_thread():
-    global synth1_outport, synth2_outport, interval, stop_threads, clock_tick_event, clock_tick_count
-    while not stop_threads:
-        synth1_outport.send(mido.Message('clock'))
-        synth2_outport.send(mido.Message('clock'))
-        clock_tick_count += 1
-        # signal stream threads every beat
-        if clock_tick_count % clocks_per_beat == 0:
-            clock_tick_event.set()
-        time.sleep(interval)
+def midi_on_messages(messages, notes, channel=0, velocity=127):
+    if not velocity:
+        velocity = velo()
+    pairs = [ (pitch_table.midi(note), velocity) for note in notes ]
+    messages.send_all('note_on', channel, pairs) # the whole chord in one batch
 
-def midi_on_messages(outport, notes, channel=0, velocity=127):
-    for note in notes:
-        if not velocity:
-            velocity = velo()
-        p = pitch.Pitch(note).midi
-        msg = mido.Message('note_on', note=p, velocity=velocity, channel=channel)
-        outport.send(msg)
-
-def midi_off_messages(outport, notes, channel=0, velocity=0):
-    for note in notes:
-        p = pitch.Pitch(note).midi
-        msg = mido.Message('note_off', note=p, velocity=velocity, channel=channel)
-        outport.send(msg)
+def midi_off_messages(messages, notes, channel=0, velocity=0):
+    pairs = [ (pitch_table.midi(note), velocity) for note in notes ]
+    messages.send_all('note_off', channel, pairs)
 
 def synth_stream_thread(program=45):
-    global default_quality, g, device, factor, synth1_outport, synth2_outport, velocity, stop_threads, clock_tick_event
-    msg = mido.Message('program_change', channel=1, program=program-1)
-    synth2_outport.send(msg)
-    while not stop_threads:
-        bank = random.randint(1, 8)
-        prog = random.randint(1, 3)
-        shift = random.choice([0, 64])
-        program = int(str(bank - 1) + str(prog - 1), 8) + shift # 8x8 bank x program
-        # program = random.randint(0, 127)
-        msg = mido.Message('program_change', channel=0, program=program)
-        synth1_outport.send(msg)
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        phrase = g.generate()
-        motif = r.motif()
-        for ph in phrase:
-            arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
-            for i,d in enumerate(motif):
-                p = pitch.Pitch(arped[i % len(arped)][1]).name
-                i = g.scale.index(p) if p in g.scale else None
-                if i:
-                    quality = g.chord_map[i]
-                if not i: # or quality == 'dim':
-                    quality = default_quality
-                c = p + quality
-                print(c)
-                c = pychord.Chord(c)
-                c = c.components_with_pitch(root_pitch=g.octave)
-                # bassline = [ pitch.Pitch(c[0]).midi - 12 ]
-                bassline = [ pitch.Pitch(random.choice(c)).midi - 12 ]
-                print(pitch.Pitch(bassline[0]).name)
-                midi_on_messages(synth1_outport, c, 0)
-                midi_on_messages(synth2_outport, bassline, 1)
-                time.sleep(d * factor)
-                midi_off_messages(synth1_outport, c, 0)
-                midi_off_messages(synth2_outport, bassline, 1)
+    global default_quality, g, device, factor, synth1_outport, synth2_outport, synth1_messages, synth2_messages, velocity, stop_threads, clock_tick_event, grid, tracker
+    try:
+        pause = grid.sleep if grid else time.sleep
+        msg = mido.Message('program_change', channel=1, program=program-1)
+        synth2_outport.send(msg)
+        while not stop_threads:
+            bank = random.randint(1, 8)
+            prog = random.randint(1, 3)
+            shift = random.choice([0, 64])
+            program = int(str(bank - 1) + str(prog - 1), 8) + shift # 8x8 bank x program
+            # program = random.randint(0, 127)
+            msg = mido.Message('program_change', channel=0, program=program)
+            synth1_outport.send(msg)
+            clock_tick_event.wait() # wait for the next beat (PLL sync)
+            clock_tick_event.clear()
+            if grid:
+                grid.phrase() # count the steps from this beat
+            phrase = g.generate()
+            motif = r.motif()
+            for ph in phrase:
+                arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
+                for i,d in enumerate(motif):
+                    if stop_threads:
+                        return
+                    p = pitch_table.name(arped[i % len(arped)][1])
+                    i = g.scale.index(p) if p in g.scale else None
+                    if i:
+                        quality = g.chord_map[i]
+                    if not i: # or quality == 'dim':
+                        quality = default_quality
+                    c = p + quality
+                    print(c)
+                    c = chord_cache.midi_notes(c, g.octave)
+                    # bassline = [ c[0] - 12 ]
+                    bassline = [ random.choice(c) - 12 ]
+                    print(pitch_table.name(bassline[0]))
+                    midi_on_messages(synth1_messages, c, 0)
+                    midi_on_messages(synth2_messages, bassline, 1)
+                    pause(d * factor)
+                    midi_off_messages(synth1_messages, c, 0)
+                    midi_off_messages(synth2_messages, bassline, 1)
+    finally:
+        tracker.release() # however the thread ends, even on an error
 
 if __name__ == "__main__":
     synth1_port_name = sys.argv[1]      if len(sys.argv) > 1 else 'USB MIDI Interface'
     synth2_port_name = sys.argv[2]      if len(sys.argv) > 2 else 'SE-02'
     factor           = int(sys.argv[3]) if len(sys.argv) > 3 else 16
     default_quality  = sys.argv[4]      if len(sys.argv) > 4 else 'm' # minor
+    timing           = sys.argv[5]      if len(sys.argv) > 5 else 'sleep' # or 'grid': play the steps on the clock's ticks
 
     g = Generator(
         octave=4,
@@ -121,10 +119,10 @@ if __name__ == "__main__":
 
     # signal the synth1_stream thread on each clock tick
     clock_tick_event = threading.Event()
-    clock_tick_count = 0
     bpm = 100 # for the clock
     clocks_per_beat = 24
     interval = 60 / (bpm * clocks_per_beat) # time between clock messages at 24 PPQN per beat
+    stats = ClockStats('midi-thread-9', bpm, clocks_per_beat)
     stop_threads = False
 
     velocity = 100
@@ -132,9 +130,13 @@ if __name__ == "__main__":
 
     with mido.open_output(synth1_port_name) as synth1_outport, mido.open_output(synth2_port_name) as synth2_outport:
         print(synth1_outport, synth2_outport)
-        clock_thread = threading.Thread(target=midi_clock_thread, daemon=True) # daemon = stops when main thread exits
+        tracker = NoteTracker() # sounding notes, released on stop
+        synth1_messages = MessageCache(synth1_outport, tracker=tracker)
+        synth2_messages = MessageCache(synth2_outport, tracker=tracker)
+        clock = ClockProcess([synth1_outport.name, synth2_outport.name], bpm, clocks_per_beat, on_beat=clock_tick_event.set, stats=stats)
+        grid = Grid(clock) if timing == 'grid' else None
         synth_thread = threading.Thread(target=synth_stream_thread, daemon=True)
-        clock_thread.start()
+        clock.start()
         synth_thread.start()
         try:
             while True:
@@ -142,10 +144,18 @@ if __name__ == "__main__":
         except KeyboardInterrupt:
             print("\nSignaling threads to stop...")
             stop_threads = True
-            clock_thread.join()
-            synth_thread.join()
+            clock.stop()
+            clock_tick_event.set() # wake the threads waiting for a beat
+            tracker.release() # silence the notes now, not after the current step
+            synth_thread.join(timeout=1)
             print("All threads stopped.")
+            stats.report()
+            if grid:
+                grid.report('synth_stream')
+            chord_cache.report()
+            tracker.report()
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            tracker.release()
         finally:
             synth1_outport.close()
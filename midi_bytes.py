@@ -0,0 +1,201 @@
+"""
+Send pre-encoded MIDI bytes, skipping mido.Message construction on the
+timing path
+
+usage:
+  messages = MessageCache(outport)
+  messages.send('note_on', 9, 36, 100) # type, channel, note, velocity
+  messages.send('control_change', 0, 74, 64) # type, channel, control, value
+
+Messages per second with mido.Message versus the cache:
+  python midi_bytes.py [port] [count]
+  python midi_bytes.py 'IAC Driver Bus 1' 100000
+"""
+import sys
+import threading
+import time
+import mido
+
+CLOCK_BYTES = [0xF8]
+
+# status byte of each channel message type, and how many data bytes follow
+CHANNEL_STATUS = {
+    'note_off': (0x80, 2),
+    'note_on': (0x90, 2),
+    'polytouch': (0xA0, 2),
+    'control_change': (0xB0, 2),
+    'program_change': (0xC0, 1),
+    'aftertouch': (0xD0, 1),
+    'pitchwheel': (0xE0, 2),
+}
+SYSTEM_BYTES = {
+    'clock': [0xF8],
+    'start': [0xFA],
+    'continue': [0xFB],
+    'stop': [0xFC],
+}
+
+def port_lock(port):
+    """
+    The lock port.send() holds: mido's rtmidi Output overrides send() to
+    take its own _send_lock, other ports take the BasePort _lock
+    """
+    return getattr(port, '_send_lock', None) or getattr(port, '_lock', None)
+
+def raw_sender(port):
+    """
+    Return a function that writes already-encoded MIDI bytes to port. With
+    the rtmidi backend the bytes go straight to the rtmidi output, under
+    the port's lock so other threads can keep using port.send(). Other
+    backends get a cached mido.Message per distinct byte string.
+    """
+    rt = getattr(port, '_rt', None)
+    if rt is not None and hasattr(rt, 'send_message'):
+        lock = port_lock(port)
+        if lock is None:
+            return rt.send_message
+        def send(data):
+            with lock:
+                rt.send_message(data)
+        return send
+    messages = {}
+    def send(data):
+        key = bytes(data)
+        msg = messages.get(key)
+        if msg is None:
+            msg = messages[key] = mido.Message.from_bytes(data)
+        port.send(msg)
+    return send
+
+def batch_sender(port):
+    """
+    Return a function that writes a list of encoded messages, e.g. all the
+    notes of a chord, back to back. rtmidi takes exactly one complete
+    message per send_message() call on every backend (it rejects longer
+    non-sysex data), so with rtmidi the messages go out one call each
+    under a single hold of the port lock, and other threads cannot slip a
+    message into the middle of the chord. Other backends fall back to one
+    raw_sender() call each.
+    """
+    rt = getattr(port, '_rt', None)
+    if rt is not None and hasattr(rt, 'send_message'):
+        lock = port_lock(port) or threading.Lock()
+        def send(messages):
+            with lock:
+                for msg in messages:
+                    rt.send_message(msg)
+        return send
+    send_raw = raw_sender(port)
+    def send(messages):
+        for msg in messages:
+            send_raw(msg)
+    return send
+
+def encode(type, channel=0, data1=0, data2=0):
+    """
+    Encode a message as a list of bytes, with the same range checks as
+    mido.Message. data1 and data2 are the message's fields in order, e.g.
+    note and velocity, or control and value. pitchwheel takes the pitch
+    (-8192 to 8191) as data1.
+    """
+    if type in SYSTEM_BYTES:
+        return SYSTEM_BYTES[type]
+    if type not in CHANNEL_STATUS:
+        raise ValueError(f"unknown message type {type!r}")
+    status, size = CHANNEL_STATUS[type]
+    if not 0 <= channel <= 15:
+        raise ValueError('channel must be in range 0..15')
+    if type == 'pitchwheel':
+        if not -8192 <= data1 <= 8191:
+            raise ValueError('pitch must be in range -8192..8191')
+        value = data1 + 8192
+        return [status | channel, value & 0x7F, value >> 7]
+    for data in (data1, data2)[:size]:
+        if not 0 <= data <= 127:
+            raise ValueError('data bytes must be in range 0..127')
+    return [status | channel, data1, data2][:size + 1]
+
+class MessageCache(object):
+    """
+    Send messages to one port by (type, channel, data1, data2), encoding
+    and validating each distinct message once. Drum and controller
+    scripts only ever send a handful of different messages, so after the
+    first few steps every send is a dict lookup and a raw write. With a
+    note_tracker.NoteTracker, sent notes are tracked so they can be
+    released on stop.
+    """
+    def __init__(self, port, tracker=None):
+        self.port = port
+        self.tracker = tracker
+        self.send_raw = raw_sender(port)
+        self.send_batch = batch_sender(port)
+        self.encoded = {}
+        self.labels = {}
+
+    def encode(self, type, channel=0, data1=0, data2=0):
+        key = (type, channel, data1, data2)
+        data = self.encoded.get(key)
+        if data is None:
+            data = self.encoded[key] = encode(type, channel, data1, data2)
+        return data
+
+    def send(self, type, channel=0, data1=0, data2=0):
+        """Send the message and return its encoded bytes"""
+        key = (type, channel, data1, data2)
+        data = self.encoded.get(key)
+        if data is None:
+            data = self.encoded[key] = encode(type, channel, data1, data2)
+        self.send_raw(data)
+        if self.tracker:
+            self.tracker.track(self.port, data)
+        return data
+
+    def send_all(self, type, channel, pairs):
+        """
+        Send one message per (data1, data2) pair in a single batch, e.g.
+        the note_ons of a chord, and return the encoded messages
+        """
+        batch = [ self.encode(type, channel, data1, data2) for data1, data2 in pairs ]
+        self.send_batch(batch)
+        if self.tracker:
+            for data in batch:
+                self.tracker.track(self.port, data)
+        return batch
+
+    def label(self, data):
+        """mido's description of encoded bytes, for logging"""
+        key = bytes(data)
+        text = self.labels.get(key)
+        if text is None:
+            text = self.labels[key] = str(mido.Message.from_bytes(data))
+        return text
+
+if __name__ == "__main__":
+    name  = sys.argv[1]      if len(sys.argv) > 1 else None # no port = discard the messages
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+
+    class NullPort(object):
+        def send(self, msg):
+            pass
+        def close(self):
+            pass
+
+    port = mido.open_output(name) if name else NullPort()
+    notes = [ (n % 4, 36 + n % 8, 64 + n % 32) for n in range(64) ] # channel, note, velocity
+    try:
+        start = time.perf_counter()
+        for i in range(count):
+            channel, note, velocity = notes[i % 64]
+            port.send(mido.Message('note_on', note=note, velocity=velocity, channel=channel))
+        before = count / (time.perf_counter() - start)
+
+        messages = MessageCache(port)
+        start = time.perf_counter()
+        for i in range(count):
+            channel, note, velocity = notes[i % 64]
+            messages.send('note_on', channel, note, velocity)
+        after = count / (time.perf_counter() - start)
+    finally:
+        port.close()
+    print(f"mido.Message: {before:,.0f} messages/s")
+    print(f"MessageCache: {after:,.0f} messages/s ({after / before:.1f}x)")
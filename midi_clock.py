@@ -0,0 +1,258 @@
+"""
+Drift-free MIDI clock for the threaded players
+
+usage:
+  clock = Clock(outport, bpm=100, on_beat=clock_tick_event.set)
+  clock.start()
+  ...
+  clock.stop()
+"""
+import ctypes
+import ctypes.util
+import sys
+import threading
+from time import monotonic, sleep
+import realtime
+from clock_stats import Histogram
+from midi_bytes import CLOCK_BYTES, raw_sender
+
+TIMER_ABSTIME = 1
+
+def absolute_sleeper():
+    """
+    Return a function that sleeps until an absolute time.monotonic() deadline.
+    Uses libc clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME) where available,
+    so oversleep does not accumulate, and falls back to a relative sleep.
+    """
+    libc = ctypes.util.find_library('c')
+    if libc and sys.platform.startswith('linux'):
+        libc = ctypes.CDLL(libc, use_errno=True)
+        if hasattr(libc, 'clock_nanosleep'):
+            class timespec(ctypes.Structure):
+                _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+            def sleep_until(deadline):
+                ns = int(deadline * 1e9)
+                ts = timespec(ns // 1_000_000_000, ns % 1_000_000_000)
+                libc.clock_nanosleep(1, TIMER_ABSTIME, ctypes.byref(ts), None) # 1 = CLOCK_MONOTONIC
+            return sleep_until
+    def sleep_until(deadline):
+        remaining = deadline - monotonic()
+        if remaining > 0:
+            sleep(remaining)
+    return sleep_until
+
+class ClockFanOut(object):
+    """
+    Send the pre-encoded 0xF8 clock byte to several ports and measure the
+    skew between the first and last port on every tick.
+
+    mode is one of:
+      ordered  - send to the ports in list order
+      rotate   - move the first port round-robin, spreading the send delay
+      parallel - send to every port at once, one sender thread per port
+
+    ordered is the default. parallel costs two Barrier round-trips per
+    tick, and the rtmidi sends mostly run one at a time under the GIL
+    anyway, so only use it where the skew report shows that it helps. Its
+    sender threads get the same realtime.set_realtime() settings as the
+    clock thread (by default read from $CLOCK_REALTIME).
+    """
+    def __init__(self, ports, mode='ordered', settings=None):
+        self.ports = ports
+        self.mode = mode
+        self.settings = realtime.from_env() if settings is None else settings
+        self.senders = [ raw_sender(port) for port in ports ]
+        self.sent = [0.0] * len(ports) # monotonic time of the last send per port
+        self.skew = Histogram() # microseconds
+        self.ticks = 0
+        self.threads = []
+        if mode == 'parallel' and len(ports) > 1:
+            self.start_barrier = threading.Barrier(len(ports))
+            self.done_barrier = threading.Barrier(len(ports))
+            for i in range(1, len(ports)):
+                thread = threading.Thread(target=self._sender, args=(i,), daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def _sender(self, i):
+        if self.settings:
+            realtime.set_realtime(**self.settings)
+        while True:
+            try:
+                self.start_barrier.wait()
+            except threading.BrokenBarrierError:
+                return
+            self.senders[i](CLOCK_BYTES)
+            self.sent[i] = monotonic()
+            try:
+                self.done_barrier.wait()
+            except threading.BrokenBarrierError:
+                return
+
+    def send(self):
+        n = len(self.senders)
+        if self.threads:
+            self.start_barrier.wait()
+            self.senders[0](CLOCK_BYTES)
+            self.sent[0] = monotonic()
+            self.done_barrier.wait()
+        else:
+            first = self.ticks % n if self.mode == 'rotate' else 0
+            for i in range(first, first + n):
+                self.senders[i % n](CLOCK_BYTES)
+                self.sent[i % n] = monotonic()
+        self.ticks += 1
+        if n > 1:
+            self.skew.record((max(self.sent) - min(self.sent)) * 1e6)
+
+    def close(self):
+        if self.threads:
+            self.start_barrier.abort()
+            self.done_barrier.abort()
+            for thread in self.threads:
+                thread.join()
+            self.threads = []
+
+    def report(self):
+        if len(self.ports) < 2:
+            return
+        skew = self.skew.summary()
+        print(f"Clock fan-out ({self.mode}) to {len(self.ports)} ports: skew p50 {skew['p50']}us, "
+              f"p99 {skew['p99']}us, max {skew['max']}us")
+
+class Clock(object):
+    """
+    Send MIDI clock to one or more ports from a background thread. Tick n
+    is due at start + n * interval, so the time spent sending and any
+    scheduler overshoot are absorbed by the next wait instead of piling up.
+
+    on_beat is a callable, or list of callables, run after every ppqn-th tick.
+    fanout is the ClockFanOut mode used to reach several ports.
+    realtime holds realtime.set_realtime() settings for the clock thread;
+    by default they are read from $CLOCK_REALTIME.
+    """
+    def __init__(self, ports, bpm, ppqn=24, on_beat=None, stats=None, spin=0.0005, realtime=None, fanout='ordered'):
+        self.ports = list(ports) if isinstance(ports, (list, tuple)) else [ports]
+        self.bpm = bpm
+        self.ppqn = ppqn
+        if on_beat is None:
+            on_beat = []
+        self.on_beat = list(on_beat) if isinstance(on_beat, (list, tuple)) else [on_beat]
+        self.stats = stats
+        self.spin = spin # seconds of busy-wait before each deadline
+        self.realtime = realtime
+        self.fanout = ClockFanOut(self.ports, mode=fanout, settings=realtime)
+        self.ticks = 0
+        self.start_time = None
+        self.sleep_until = absolute_sleeper()
+        self.running = False
+        self.thread = None
+
+    @property
+    def interval(self):
+        return 60 / (self.bpm * self.ppqn)
+
+    @property
+    def beats(self):
+        return self.ticks // self.ppqn
+
+    @property
+    def beat_tick(self):
+        return self.ticks % self.ppqn
+
+    def tick_time(self, tick):
+        """The monotonic() time at which the tick counter reaches tick"""
+        return self.start_time + (tick - 1) * self.interval
+
+    def wait_for_tick(self, tick):
+        """Sleep until the tick counter reaches tick; return how late the wake-up was"""
+        due = self.tick_time(tick)
+        self.sleep_until(due)
+        return monotonic() - due
+
+    def start(self):
+        self.start_time = monotonic()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        self.fanout.close()
+
+    def tick(self):
+        self.fanout.send()
+
+    def _run(self):
+        settings = realtime.from_env() if self.realtime is None else self.realtime
+        if settings:
+            realtime.set_realtime(**settings)
+        sleep_until = absolute_sleeper()
+        interval = self.interval
+        spin = min(self.spin, interval)
+        start = self.start_time
+        if self.stats:
+            self.stats.start(start)
+        while self.running:
+            deadline = start + self.ticks * interval
+            sleep_until(deadline - spin)
+            while monotonic() < deadline:
+                pass
+            if not self.running:
+                break
+            self.tick()
+            if self.stats:
+                self.stats.tick(deadline)
+            self.ticks += 1
+            if self.ticks % self.ppqn == 0:
+                for fn in self.on_beat:
+                    fn()
+
+class Grid(object):
+    """
+    Step through a phrase on a clock's tick grid instead of sleeping for
+    each duration. Steps are counted in ticks from the beat the phrase
+    started on, so send time and sleep overshoot cannot add up over a
+    phrase, and voices following the same clock stay together. Works with
+    Clock, clock_process.ClockProcess and clock_follower.ClockFollower.
+
+    usage:
+      grid = Grid(clock)
+      grid.phrase() # after the beat arrives
+      for note, beats in motif:
+          ... note_on
+          grid.sleep(beats)
+          ... note_off
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.start = 0 # tick the phrase started on
+        self.position = 0.0 # ticks into the phrase
+        self.offset = Histogram() # microseconds each step woke after its grid time
+
+    def phrase(self):
+        """Start a phrase on the nearest beat, but not before the last phrase ended"""
+        ppqn = self.clock.ppqn
+        # a step that wakes at its tick time can run ahead of a ClockProcess
+        # publishing that tick, so beats may still be the one before
+        beat = int(self.clock.ticks / ppqn + 0.5) * ppqn
+        self.start = max(self.tick(), beat)
+        self.position = 0.0
+
+    def tick(self, beats=0):
+        """The grid tick beats after the current step"""
+        return self.start + round(self.position + beats * self.clock.ppqn)
+
+    def sleep(self, beats):
+        """Wait until the next step, beats after the current one"""
+        tick = self.tick(beats)
+        self.position += beats * self.clock.ppqn
+        late = self.clock.wait_for_tick(tick)
+        self.offset.record(late * 1e6)
+
+    def report(self, name):
+        offset = self.offset.summary()
+        print(f"{name} grid offset: {offset['count']} steps, p50 {offset['p50']}us, "
+              f"p99 {offset['p99']}us, max {offset['max']}us")
@@ -0,0 +1,49 @@
+"""
+Callback-driven MIDI input that drops clock, active sensing and sysex
+before they reach Python
+
+usage:
+  def handle(msg):
+      outport.send(msg)
+
+  inport = open_input('MIDI ROCK Joystick', handle) # clock=True to keep clock
+  ...
+  inport.close()
+"""
+import mido
+
+# message types ignored unless asked for, when the backend cannot drop them itself
+IGNORED = {
+    'sysex': ('sysex',),
+    'timing': ('clock', 'quarter_frame'),
+    'active_sense': ('active_sensing',),
+}
+
+def ignore_types(port, sysex=True, timing=True, active_sense=True):
+    """
+    Have the rtmidi backend drop the given message kinds; timing is clock
+    and MTC quarter frames. Returns False if the port has no rtmidi input
+    underneath, so the caller must filter them itself.
+    """
+    rt = getattr(port, '_rt', None)
+    if rt is None or not hasattr(rt, 'ignore_types'):
+        return False
+    rt.ignore_types(sysex=sysex, timing=timing, active_sense=active_sense)
+    return True
+
+def open_input(name, callback, clock=False, sysex=False, active_sense=False):
+    """
+    Open an input port that calls callback(msg) from the backend's thread.
+    With rtmidi the ignored kinds are dropped in the C++ layer, so mido
+    never parses them into Message objects and the callback only runs for
+    messages the router handles; other backends filter by type first.
+    """
+    ignore = { 'sysex': not sysex, 'timing': not clock, 'active_sense': not active_sense }
+    types = { t for kind, on in ignore.items() if on for t in IGNORED[kind] }
+    def filtered(msg):
+        if msg.type not in types:
+            callback(msg)
+    port = mido.open_input(name, callback=filtered)
+    if ignore_types(port, **ignore):
+        port.callback = callback # nothing left to filter
+    return port
@@ -10,6 +10,7 @@ import time
 from find_primes import all_primes
 from music_creatingrhythms import Rhythms
 from random_rhythms import Rhythm
+from midi_bytes import MessageCache
 
 class DrumMachine:
     def __init__(self, bpm=120):
@@ -38,10 +39,10 @@ class DrumMachine:
         self.N = 0
         self.primes = all_primes(self.beats, 'list')
         self.outport = None
+        self.messages = None
 
     def midi_msg(self, event, note, channel, velocity):
-        msg = mido.Message(event, note=note, channel=channel, velocity=velocity)
-        self.outport.send(msg)
+        self.messages.send(event, channel, note, velocity)
 
     def velo(self):
         return 64 + random.randint(-10, 10)
@@ -126,6 +127,7 @@ class DrumMachine:
         try:
             with mido.open_output(port_name) as outport:
                 self.outport = outport
+                self.messages = MessageCache(outport) # encoded once per distinct message
                 print(self.outport)
                 print("Drum machine running... Ctrl+C to stop.")
                 self.play()
@@ -6,16 +6,17 @@ import time
 
 from find_primes import all_primes
 from music_creatingrhythms import Rhythms
+from midi_bytes import MessageCache
 
-def midi_msg(outport, event, note, channel, velocity):
-    msg = mido.Message(event, note=note, channel=channel, velocity=velocity)
-    outport.send(msg)
+def midi_msg(messages, event, note, channel, velocity):
+    messages.send(event, channel, note, velocity)
 
 def drum_part(port_name):
     global r, patterns, drums, dura, beats, N, velo, random_note, primes
     try:
         with mido.open_output(port_name) as outport:
             print(f"Opened output port: {outport.name}")
+            messages = MessageCache(outport) # encoded once per distinct message
             print("Drum machine running... Ctrl+C to stop.")
             try:
                 while True:
@@ -30,20 +31,20 @@ def drum_part(port_name):
                         drums['hihat'] = random_note()
                     for step in range(beats):
                         if patterns['kick'][step]:
-                            midi_msg(outport, 'note_on', drums['kick'], 0, velo())
+                            midi_msg(messages, 'note_on', drums['kick'], 0, velo())
                         if patterns['snare'][step]:
-                            midi_msg(outport, 'note_on', drums['snare'], 1, velo())
+                            midi_msg(messages, 'note_on', drums['snare'], 1, velo())
                         if patterns['hihat'][step]:
-                            midi_msg(outport, 'note_on', drums['hihat'], 2, velo())
+                            midi_msg(messages, 'note_on', drums['hihat'], 2, velo())
                         
                         time.sleep(dura * 0.9) # slightly shorter than step to prevent overlap
 
                         if patterns['kick'][step]:
-                            midi_msg(outport, 'note_off', drums['kick'], 0, 0)
+                            midi_msg(messages, 'note_off', drums['kick'], 0, 0)
                         if patterns['snare'][step]:
-                            midi_msg(outport, 'note_off', drums['snare'], 1, 0)
+                            midi_msg(messages, 'note_off', drums['snare'], 1, 0)
                         if patterns['hihat'][step]:
-                            midi_msg(outport, 'note_off', drums['hihat'], 2, 0)
+                            midi_msg(messages, 'note_off', drums['hihat'], 2, 0)
 
                         time.sleep(dura * 0.1) # Remainder of the step duration
                     N += 1
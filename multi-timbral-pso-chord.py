@@ -7,10 +7,12 @@ import subprocess
 import time
 import threading
 import mido
-from music21 import pitch
 from music_melodicdevice import Device
 from random_rhythms import Rhythm
 from music_bassline_generator import Bassline
+from clock_stats import ClockStats
+from midi_clock import Clock
+import pitch_table
 
 def generate():
     command = ['perl', 'pso-chord.pl']
@@ -18,7 +20,7 @@ def generate():
         result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
         # print("STDOUT:", result.stdout)
         notes = result.stdout.split()
-        notes = [ pitch.Pitch(n).midi for n in notes ]
+        notes = [ pitch_table.midi(n) for n in notes ]
         print(f"Notes: {notes}")
         # print("STDERR:", result.stderr)
         return [notes]
@@ -37,18 +39,6 @@ def midi_message(outport, channel, note, dura):
     msg = mido.Message('note_off', note=note, velocity=v, channel=channel)
     outport.send(msg)
 
-def midi_clock_thread():
-    global phrase1, phrase2, interval, stop_threads, clock_tick_event, clock_tick_count
-    while not stop_threads:
-        outport.send(mido.Message('clock'))
-        clock_tick_count += 1
-        # signal stream threads every beat
-        if clock_tick_count % clocks_per_beat == 0:
-            clock_tick_event.set()
-            # phrase1 = generate()
-            # phrase2 = generate()
-        time.sleep(interval)
-
 def stream0_thread_fn():
     global phrase1, device, factor, outport, stop_threads, clock_tick_event
     channel = 0
@@ -64,7 +54,7 @@ def stream0_thread_fn():
             for ph in phrase1:
                 arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
                 for i,d in enumerate(motif):
-                    p = pitch.Pitch(arped[i % len(arped)][1]).midi
+                    p = pitch_table.midi(arped[i % len(arped)][1])
                     if transpose:
                         p -= 12
                         if chance():
@@ -86,7 +76,7 @@ def stream1_thread_fn():
             for ph in phrase2:
                 arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
                 for i,d in enumerate(motif):
-                    p = pitch.Pitch(arped[i % len(arped)][1]).midi
+                    p = pitch_table.midi(arped[i % len(arped)][1])
                     if transpose:
                         p -= 12
                         if chance():
@@ -134,12 +124,11 @@ if __name__ == "__main__":
     bpm = 60 # for the clock
     # signal the threads on each clock tick
     clock_tick_event = threading.Event()
-    # clock tick counter
-    clock_tick_count = 0
     # clock ticks per beat
     clocks_per_beat = 24
     # time between clock messages at 24 PPQN per beat
     interval = 60 / (bpm * clocks_per_beat)
+    stats = ClockStats('multi-timbral-pso-chord', bpm, clocks_per_beat)
     stop_threads = False
 
     phrase1 = [] # generated on each clock interval
@@ -152,11 +141,11 @@ if __name__ == "__main__":
 
     with mido.open_output(port_name) as outport:
         print(outport)
-        clock_thread = threading.Thread(target=midi_clock_thread, daemon=True) # daemon = stops when main thread exits
+        clock = Clock(outport, bpm, clocks_per_beat, on_beat=clock_tick_event.set, stats=stats)
         stream0_thread = threading.Thread(target=stream0_thread_fn, daemon=True)
         stream1_thread = threading.Thread(target=stream1_thread_fn, daemon=True)
         stream2_thread = threading.Thread(target=stream2_thread_fn, daemon=True)
-        clock_thread.start()
+        clock.start()
         stream0_thread.start()
         stream1_thread.start()
         stream2_thread.start()
@@ -168,11 +157,12 @@ if __name__ == "__main__":
             outport.send(mido.Message('stop'))
             print("\nSignaling threads to stop...")
             stop_threads = True
-            clock_thread.join()
+            clock.stop()
             stream0_thread.join()
             stream1_thread.join()
             stream2_thread.join()
             print("All threads stopped.")
+            stats.report()
             msg = mido.Message('control_change', channel=0, control=123, value=0)
             outport.send(msg)
             msg = mido.Message('control_change', channel=1, control=123, value=0)
@@ -1,99 +1,111 @@
 # This program is for driving a multi-timbral synth, like a Waldorf, fluidsynth, or a multi-oscillator eurorack
-# > python multi-timbral.py MIDIThing2
+# > python multi-timbral.py MIDIThing2 [factor] [phrase lookahead depth]
 
 import sys
 import random
 import time
 import threading
 import mido
-from music21 import pitch
 from chord_progression_network import Generator
 from music_melodicdevice import Device
 from random_rhythms import Rhythm
 from music_bassline_generator import Bassline
+from clock_stats import ClockStats
+from midi_clock import Clock
+from beat_bus import BeatBus
+from phrase_buffer import PhraseBuffer
+from note_scheduler import NoteScheduler
+from generation_pool import GenerationPool
+from note_tracker import NoteTracker
+import pitch_table
 
-def midi_message(outport, channel, note, dura):
-    v = velo()
-    msg = mido.Message('note_on', note=note, velocity=v, channel=channel)
-    outport.send(msg)
-    time.sleep(dura)
-    msg = mido.Message('note_off', note=note, velocity=v, channel=channel)
-    outport.send(msg)
+def play_phrase(outport, channel, notes, start):
+    """Schedule (note, duration) pairs back to back from start and return when they end"""
+    global scheduler
+    for note, dura in notes:
+        scheduler.note(outport, channel, note, velo(), start, dura)
+        start += dura
+    return start
 
-def midi_clock_thread():
-    global interval, stop_threads, clock_tick_event, clock_tick_count
-    while not stop_threads:
-        outport.send(mido.Message('clock'))
-        clock_tick_count += 1
-        # signal arp_stream thread every beat
-        if clock_tick_count % CLOCKS_PER_BEAT == 0:
-            clock_tick_event.set()
-        time.sleep(interval)
+def melody_voice(scale_map, factor):
+    """Build the melody generators in a generation worker and return its phrase function"""
+    size = len(scale_map) + 1
+    transitions = [ i for i in range(1, size) ]
+    weights = [ 1 for _ in range(1, size) ]
+    g = Generator(
+        scale_note='C',
+        scale_name='ionian',
+        max=4 * 1, # beats x measures
+        tonic=False,
+        resolve=False,
+        scale=list(scale_map.keys()),
+        chord_map=list(scale_map.values()),
+        net={ i: transitions for i in range(1, size) },
+        weights={ i: weights for i in range(1, size) },
+        verbose=False,
+    )
+    device = Device(verbose=False)
+    r = Rhythm(
+        measure_size=1,
+        durations=[ 1/8, 1/4, 1/2, 1/3 ],
+        groups={ 1/3: 3 },
+    )
+    chance = lambda: random.random() < 0.5
 
-def stream0_thread_fn():
-    global g, device, factor, outport, velocity, stop_threads, clock_tick_event
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=0, program=91)
-        # outport.send(msg)
+    def phrase():
         phrase = g.generate()
         transpose = chance()
         motif = r.motif()
+        notes = []
         for ph in phrase:
             arped = device.arp(ph, duration=1, arp_type='updown', repeats=1)
             for i,d in enumerate(motif):
-                p = pitch.Pitch(arped[i % len(arped)][1]).midi
+                p = pitch_table.midi(arped[i % len(arped)][1])
                 if transpose:
                     p -= 12
                     if chance():
                         p -= 12
-                midi_message(outport, 0, p, d * factor)
+                notes.append((p, d * factor))
+        return notes
+    return phrase
 
-def stream1_thread_fn():
-    global bass, factor, outport, stop_threads, clock_tick_event
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=1, program=43)
-        # outport.send(msg)
-        note = random.choice(list(scale_map.keys()))
-        chord = note + scale_map[note]
-        bassline = bass.generate(chord, 4)
-        for n in bassline:
-            midi_message(outport, 1, n, factor)
+def bass_voice(scale_map, factor):
+    """Build a bassline generator in a generation worker and return its phrase function"""
+    bass = Bassline(
+        modal=True,
+        tonic=False,
+        resolve=False,
+    )
 
-def stream2_thread_fn():
-    global bass, factor, outport, stop_threads, clock_tick_event
-    while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=2, program=43)
-        # outport.send(msg)
+    def phrase():
         note = random.choice(list(scale_map.keys()))
         chord = note + scale_map[note]
         bassline = bass.generate(chord, 4)
-        for n in bassline:
-            midi_message(outport, 2, n, factor)
-
+        return [ (n, factor) for n in bassline ]
+    return phrase
 
-def stream3_thread_fn():
-    global bass, factor, outport, stop_threads, clock_tick_event
+def voice_stream_thread():
+    global outport, stop_threads, bus, phrases, voices
+    beats = bus.subscribe('voices')
+    free = { name: 0 for name, _ in voices } # when each voice's last phrase ends
     while not stop_threads:
-        clock_tick_event.wait() # wait for the next beat (PLL sync)
-        clock_tick_event.clear()
-        # msg = mido.Message('program_change', channel=2, program=43)
-        # outport.send(msg)
-        note = random.choice(list(scale_map.keys()))
-        chord = note + scale_map[note]
-        bassline = bass.generate(chord, 4)
-        for n in bassline:
-            midi_message(outport, 3, n, factor)
+        if beats.wait() is None: # wait for the next beat
+            break
+        now = time.monotonic()
+        for name, channel in voices:
+            if free[name] > now:
+                continue # still playing
+            notes = phrases[name].get() # generated ahead of the beat
+            if notes is None:
+                return
+            free[name] = play_phrase(outport, channel, notes, now)
 
 if __name__ == "__main__":
     port_name = sys.argv[1] if len(sys.argv) > 1 else 'MIDIThing2'
     # kludge: duration multiplier to slow down the pace of the notes
     factor = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    # phrases generated ahead per stream
+    depth = int(sys.argv[3]) if len(sys.argv) > 3 else 2
 
     bpm = 100 # for the clock
     velocity = 64
@@ -104,57 +116,43 @@ if __name__ == "__main__":
         'F': '',
         'G': '',
     }
-    size = len(scale_map) + 1
-    transitions = [ i for i in range(1, size) ]
-    weights = [ 1 for _ in range(1, size) ]
-    g = Generator(
-        scale_note='C',
-        scale_name='ionian',
-        max=4 * 1, # beats x measures
-        tonic=False,
-        resolve=False,
-        scale=list(scale_map.keys()),
-        chord_map=list(scale_map.values()),
-        net={ i: transitions for i in range(1, size) },
-        weights={ i: weights for i in range(1, size) },
-        verbose=False,
-    )
-    device = Device(verbose=False)
-    r = Rhythm(
-        measure_size=1,
-        durations=[ 1/8, 1/4, 1/2, 1/3 ],
-        groups={ 1/3: 3 },
-    )
-    bass = Bassline(
-        modal=True,
-        tonic=False,
-        resolve=False,
-    )
-    # signal the threads on each clock tick
-    clock_tick_event = threading.Event()
-    # clock tick counter
-    clock_tick_count = 0
+    # the voices generate their phrases in a worker process, started before the ports are opened
+    pool = GenerationPool()
+    pool.add('stream0', melody_voice, scale_map, factor)
+    pool.add('stream1', bass_voice, scale_map, factor)
+    pool.add('stream2', bass_voice, scale_map, factor)
+    pool.add('stream3', bass_voice, scale_map, factor)
+    # broadcast each beat to the voice thread
+    bus = BeatBus()
+    # sounding notes, released on stop
+    tracker = NoteTracker()
+    # sends every voice's notes on time from one thread
+    scheduler = NoteScheduler(tracker=tracker)
+    voices = [ ('stream0', 0), ('stream1', 1), ('stream2', 2), ('stream3', 3) ] # name, channel
+    phrases = {
+        'stream0': PhraseBuffer('stream0', pool.generator('stream0'), depth),
+        'stream1': PhraseBuffer('stream1', pool.generator('stream1'), depth),
+        'stream2': PhraseBuffer('stream2', pool.generator('stream2'), depth),
+        'stream3': PhraseBuffer('stream3', pool.generator('stream3'), depth),
+    }
     # clock ticks per beat
     CLOCKS_PER_BEAT = 24
     # time between clock messages at 24 PPQN per beat
     interval = 60 / (bpm * CLOCKS_PER_BEAT)
+    stats = ClockStats('multi-timbral', bpm, CLOCKS_PER_BEAT)
     stop_threads = False
 
-    chance = lambda: random.random() < 0.5
     velo = lambda: velocity + random.randint(-40, 40)
 
     with mido.open_output(port_name) as outport:
         print(outport)
-        clock_thread = threading.Thread(target=midi_clock_thread, daemon=True) # daemon = stops when main thread exits
-        stream0_thread = threading.Thread(target=stream0_thread_fn, daemon=True)
-        stream1_thread = threading.Thread(target=stream1_thread_fn, daemon=True)
-        stream2_thread = threading.Thread(target=stream2_thread_fn, daemon=True)
-        stream3_thread = threading.Thread(target=stream3_thread_fn, daemon=True)
-        clock_thread.start()
-        stream0_thread.start()
-        stream1_thread.start()
-        stream2_thread.start()
-        stream3_thread.start()
+        clock = Clock(outport, bpm, CLOCKS_PER_BEAT, on_beat=bus.publish, stats=stats)
+        voice_thread = threading.Thread(target=voice_stream_thread, daemon=True)
+        for buffer in phrases.values():
+            buffer.start()
+        scheduler.start()
+        clock.start()
+        voice_thread.start()
         outport.send(mido.Message('start'))
         try:
             while True:
@@ -163,21 +161,25 @@ if __name__ == "__main__":
             outport.send(mido.Message('stop'))
             print("\nSignaling threads to stop...")
             stop_threads = True
-            clock_thread.join()
-            stream0_thread.join()
-            stream1_thread.join()
-            stream2_thread.join()
-            stream3_thread.join()
+            clock.stop()
+            bus.close()
+            voice_thread.join()
+            scheduler.stop()
+            for buffer in phrases.values():
+                buffer.stop()
+            pool.shutdown()
+            tracker.release()
             print("All threads stopped.")
-            msg = mido.Message('control_change', channel=0, control=123, value=0)
-            outport.send(msg)
-            msg = mido.Message('control_change', channel=1, control=123, value=0)
-            outport.send(msg)
-            msg = mido.Message('control_change', channel=2, control=123, value=0)
-            outport.send(msg)
-            msg = mido.Message('control_change', channel=3, control=123, value=0)
-            outport.send(msg)
+            stats.report()
+            bus.report()
+            scheduler.report()
+            for buffer in phrases.values():
+                buffer.report()
+            pool.report()
+            tracker.report()
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+            scheduler.stop()
+            tracker.release()
         finally:
             outport.close()
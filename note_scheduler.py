@@ -0,0 +1,118 @@
+"""
+One dispatcher thread for every voice's note_on and note_off messages
+
+usage:
+  scheduler = NoteScheduler()
+  scheduler.start()
+  t = time.monotonic()
+  for note, duration in phrase:
+      scheduler.note(outport, 0, note, 100, t, duration)
+      t += duration
+  ...
+  scheduler.stop() # sends the note_offs still pending
+  scheduler.report()
+"""
+import heapq
+import itertools
+import threading
+from time import monotonic
+import mido
+from clock_stats import Histogram
+
+class NoteScheduler(object):
+    """
+    Keep (time, message) events on a heap ordered by absolute
+    time.monotonic() and send each one from a single thread when it is
+    due. Generators hand over whole phrases at once instead of sleeping
+    through every note, so any number of voices, overlapping notes and
+    chords share one thread, and a note's length does not grow by the
+    time it took to send it. Sent notes are recorded in tracker, a
+    note_tracker.NoteTracker, if one is given.
+    """
+    def __init__(self, spin=0.0005, tracker=None):
+        self.spin = spin # seconds of busy-wait before each event
+        self.tracker = tracker
+        self.heap = []
+        self.seq = itertools.count() # keeps events at the same time in the order they were added
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.sent = 0
+        self.max_depth = 0
+        self.lateness = Histogram() # microseconds past the due time
+
+    @property
+    def depth(self):
+        """Events waiting to be sent"""
+        return len(self.heap)
+
+    def send_at(self, when, port, msg):
+        with self.cond:
+            seq = next(self.seq)
+            heapq.heappush(self.heap, (when, seq, port, msg))
+            if len(self.heap) > self.max_depth:
+                self.max_depth = len(self.heap)
+            if self.heap[0][1] == seq:
+                self.cond.notify() # new earliest event
+
+    def note(self, port, channel, note, velocity, start, duration):
+        """Schedule a note_on at start and its note_off duration seconds later"""
+        self.send_at(start, port, mido.Message('note_on', note=note, velocity=velocity, channel=channel))
+        self.send_at(start + duration, port, mido.Message('note_off', note=note, velocity=velocity, channel=channel))
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, flush=True):
+        """Stop dispatching. With flush, pending note_offs are sent right away (with a tracker, only those of notes that started)"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread:
+            self.thread.join()
+        with self.cond:
+            pending, self.heap = self.heap, []
+        if flush:
+            for _, _, port, msg in sorted(pending):
+                if msg.type != 'note_off':
+                    continue
+                if self.tracker is None:
+                    port.send(msg)
+                elif self.tracker.is_on(port, msg.channel, msg.note): # skip the notes that never started
+                    port.send(msg)
+                    self.tracker.track_message(port, msg)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    if self.heap:
+                        wait = self.heap[0][0] - monotonic() - self.spin
+                        if wait <= 0:
+                            break
+                        self.cond.wait(wait)
+                    else:
+                        self.cond.wait()
+                if not self.running:
+                    return
+                when = self.heap[0][0]
+            while monotonic() < when:
+                pass
+            with self.cond:
+                due = []
+                now = monotonic()
+                while self.heap and self.heap[0][0] <= now:
+                    due.append(heapq.heappop(self.heap))
+            for when, _, port, msg in due:
+                port.send(msg)
+                if self.tracker:
+                    self.tracker.track_message(port, msg)
+                self.lateness.record((monotonic() - when) * 1e6)
+                self.sent += 1
+
+    def report(self):
+        late = self.lateness.summary()
+        print(f"Note scheduler: {self.sent} messages, max queue depth {self.max_depth}, "
+              f"lateness p50 {late['p50']}us, p99 {late['p99']}us, max {late['max']}us")
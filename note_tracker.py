@@ -0,0 +1,99 @@
+"""
+Track the notes sounding on each port and channel, so every note_on gets
+its note_off
+
+usage:
+  tracker = NoteTracker()
+  messages = MessageCache(outport, tracker=tracker)
+  scheduler = NoteScheduler(tracker=tracker)
+  ...
+  tracker.release() # on stop or error: note_offs for whatever still sounds
+  tracker.release(outport) # or only for one port's notes
+  tracker.report()
+"""
+import threading
+import mido
+
+class NoteTracker(object):
+    """
+    A 128-bit set per port and channel, with a bit set from a note's
+    note_on until its note_off. release() sends a note_off for each bit
+    still set, instead of a blanket all-notes-off CC that some synths
+    ignore, and counts those notes as stuck.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {} # port: 16 bitsets, bit n set while note n sounds
+        self.ons = 0
+        self.retriggered = 0 # note_ons for a note already sounding
+        self.unmatched = 0 # note_offs for a note not sounding
+        self.stuck = 0 # notes still sounding when released
+
+    def note_on(self, port, channel, note):
+        bit = 1 << note
+        with self.lock:
+            channels = self.active.get(port)
+            if channels is None:
+                channels = self.active[port] = [0] * 16
+            if channels[channel] & bit:
+                self.retriggered += 1
+            channels[channel] |= bit
+            self.ons += 1
+
+    def note_off(self, port, channel, note):
+        bit = 1 << note
+        with self.lock:
+            channels = self.active.get(port)
+            if channels is None or not channels[channel] & bit:
+                self.unmatched += 1
+                return
+            channels[channel] &= ~bit
+
+    def is_on(self, port, channel, note):
+        channels = self.active.get(port)
+        return bool(channels and channels[channel] >> note & 1)
+
+    def track(self, port, data):
+        """Record an encoded message, as sent by a MessageCache"""
+        kind = data[0] & 0xF0
+        if kind == 0x90 and data[2]:
+            self.note_on(port, data[0] & 0x0F, data[1])
+        elif kind == 0x80 or kind == 0x90:
+            self.note_off(port, data[0] & 0x0F, data[1])
+
+    def track_message(self, port, msg):
+        """Record a mido.Message"""
+        if msg.type == 'note_on' and msg.velocity:
+            self.note_on(port, msg.channel, msg.note)
+        elif msg.type == 'note_off' or msg.type == 'note_on':
+            self.note_off(port, msg.channel, msg.note)
+
+    @property
+    def sounding(self):
+        """Notes currently on"""
+        with self.lock:
+            return sum(bin(bits).count('1') for channels in self.active.values() for bits in channels)
+
+    def release(self, port=None):
+        """Send a note_off for every note still sounding, or only on port, and return how many there were"""
+        with self.lock:
+            if port is None:
+                active, self.active = self.active, {}
+            else:
+                active = { port: self.active.pop(port) } if port in self.active else {}
+        count = 0
+        for port, channels in active.items():
+            for channel, bits in enumerate(channels):
+                note = 0
+                while bits:
+                    if bits & 1:
+                        port.send(mido.Message('note_off', note=note, velocity=0, channel=channel))
+                        count += 1
+                    bits >>= 1
+                    note += 1
+        self.stuck += count
+        return count
+
+    def report(self):
+        print(f"Note tracker: {self.ons} note_ons, {self.stuck} stuck notes released, "
+              f"{self.retriggered} retriggered, {self.unmatched} unmatched note_offs")
@@ -0,0 +1,182 @@
+"""
+Route several MIDI inputs to several outputs through a YAML matrix, in
+one process
+
+usage:
+  > python patchbay.py [patchbay.yaml]
+
+  patchbay = Patchbay(spec)
+  patchbay.start()
+  ...
+  patchbay.stop()
+  patchbay.report()
+"""
+import os
+import sys
+import time
+import mido
+import yaml
+import midi_input
+from coalescer import Coalescer
+from route_trace import RouteTrace
+
+def check_spec(spec):
+    """Raise a ValueError naming the first route that refers to an unknown input or output"""
+    for i, route in enumerate(spec.get('routes') or []):
+        name = route.get('name', f"route {i + 1}")
+        if 'from' not in route or 'to' not in route:
+            raise ValueError(f"{name}: every route needs a from and a to")
+        if route['from'] not in spec.get('inputs', {}):
+            raise ValueError(f"{name}: unknown input {route['from']!r}")
+        targets = route['to'] if isinstance(route['to'], list) else [route['to']]
+        for target in targets:
+            if target not in spec.get('outputs', {}):
+                raise ValueError(f"{name}: unknown output {target!r}")
+
+class Route(object):
+    """
+    One row of the matrix: messages from an input that pass the route's
+    type, channel and note range filters go to each of its outputs,
+    optionally moved to another channel and thinned by a Coalescer.
+    """
+    def __init__(self, spec, outputs):
+        self.source = spec['from']
+        targets = spec['to'] if isinstance(spec['to'], list) else [spec['to']]
+        self.name = spec.get('name', f"{self.source} -> {', '.join(targets)}")
+        self.outputs = [ outputs[t] for t in targets ]
+        self.types = set(spec['types']) if 'types' in spec else None
+        self.channels = set(spec['channels']) if 'channels' in spec else None # incoming, 0-15
+        self.low, self.high = spec.get('notes', [0, 127])
+        self.channel = spec.get('channel') # send on this channel instead
+        self.coalescer = Coalescer(rate=spec['coalesce']) if 'coalesce' in spec else None
+        self.count = 0
+
+    def accepts(self, msg):
+        if self.types is not None and msg.type not in self.types:
+            return False
+        channel = getattr(msg, 'channel', None)
+        if channel is not None and self.channels is not None and channel not in self.channels:
+            return False
+        note = getattr(msg, 'note', None)
+        if note is not None and not self.low <= note <= self.high:
+            return False
+        return True
+
+    def send(self, msg):
+        if self.channel is not None and hasattr(msg, 'channel'):
+            msg = msg.copy(channel=self.channel)
+        for port in self.outputs:
+            port.send(msg)
+        self.count += 1
+
+class Patchbay(object):
+    """
+    Open every input and output of a spec (see patchbay.yaml) once and
+    route between them from the inputs' callbacks, so one process and no
+    thread per port replace a router process per controller. Clock and
+    sysex are dropped at the input unless a route from it asks for them.
+    """
+    def __init__(self, spec):
+        check_spec(spec)
+        self.spec = spec
+        self.inputs = {}
+        self.outputs = {}
+        self.routes = []
+        self.trace = RouteTrace('patchbay') # enabled by $ROUTE_TRACE
+        self.started = None
+
+    def start(self):
+        try:
+            self._open()
+        except Exception:
+            self.stop() # close the ports opened so far
+            raise
+
+    def _open(self):
+        for name, port_name in self.spec['outputs'].items():
+            self.outputs[name] = mido.open_output(port_name)
+        for spec in self.spec['routes']:
+            self.routes.append(Route(spec, self.outputs))
+        for route in self.routes:
+            if route.coalescer:
+                route.coalescer.start()
+        self.trace.start()
+        self.started = time.monotonic()
+        for name, port_name in self.spec['inputs'].items():
+            routes = [ r for r in self.routes if r.source == name ]
+            types = set().union(*[ r.types for r in routes if r.types is not None ])
+            everything = any(r.types is None for r in routes)
+            self.inputs[name] = midi_input.open_input(
+                port_name,
+                self.receiver(routes),
+                clock='clock' in types,
+                sysex='sysex' in types or everything,
+            )
+
+    def receiver(self, routes):
+        """The input callback for one input's routes"""
+        trace = self.trace if self.trace.enabled else None
+
+        def receive(msg):
+            received = time.monotonic()
+            for route in routes:
+                if not route.accepts(msg):
+                    continue
+                if route.coalescer and route.coalescer.coalesces(msg):
+                    route.coalescer.submit(msg, lambda route=route: self.forward(route, msg, trace, received))
+                else:
+                    self.forward(route, msg, trace, received)
+        return receive
+
+    def forward(self, route, msg, trace, received):
+        dispatched = time.monotonic()
+        route.send(msg)
+        if trace:
+            trace.record(route.name, received, dispatched, time.monotonic())
+
+    def stop(self):
+        for port in self.inputs.values():
+            port.close()
+        for route in self.routes:
+            if route.coalescer:
+                route.coalescer.stop() # sends the values still held back
+        self.trace.stop()
+        for port in self.outputs.values():
+            port.close()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        for route in self.routes:
+            print(f"{route.name}: {route.count} messages, {route.count / elapsed:.1f}/s")
+            if route.coalescer:
+                route.coalescer.report()
+        self.trace.report()
+
+if __name__ == "__main__":
+    spec_file = sys.argv[1] if len(sys.argv) > 1 else 'patchbay.yaml'
+    if not os.path.exists(spec_file):
+        print(spec_file, 'does not exist')
+        sys.exit()
+
+    with open(spec_file, 'r') as f:
+        spec = yaml.safe_load(f)
+
+    try:
+        patchbay = Patchbay(spec)
+    except ValueError as e:
+        print(f"{spec_file}: {e}")
+        sys.exit()
+    try:
+        patchbay.start()
+    except (ValueError, OSError) as e:
+        print(f"Error opening ports: {e}")
+        sys.exit()
+    print(f"Routing {', '.join(patchbay.inputs)} to {', '.join(patchbay.outputs)}. Ctrl+C to exit.")
+    try:
+        while True:
+            time.sleep(1) # the inputs' callbacks do the routing
+    except KeyboardInterrupt:
+        print("\nExiting MIDI patchbay.")
+    finally:
+        patchbay.stop()
+        patchbay.report()
@@ -0,0 +1,83 @@
+"""
+Generate phrases ahead of the beat that plays them
+
+usage:
+  def next_phrase():
+      return [ (note, duration), ... ]
+  phrases = PhraseBuffer('melody', next_phrase, depth=2)
+  phrases.start()
+  ... in the stream thread, on each beat:
+  for note, duration in phrases.get():
+      ...
+  phrases.stop()
+  phrases.report()
+"""
+import queue
+import threading
+from time import monotonic
+from clock_stats import Histogram
+
+class PhraseBuffer(object):
+    """
+    Run generate() in a producer thread and keep up to depth finished
+    phrases waiting in a bounded queue, so a stream thread only has to pop
+    one when its beat arrives. When the player finds the queue empty that
+    is an underrun: it counts it, and how long it waited for the producer.
+    """
+    def __init__(self, name, generate, depth=2):
+        self.name = name
+        self.generate = generate
+        self.depth = depth
+        self.queue = queue.Queue(maxsize=depth)
+        self.running = False
+        self.thread = None
+        self.phrases = 0 # phrases handed to the player
+        self.underruns = 0 # times the player found nothing ready
+        self.wait = Histogram() # microseconds waited on an underrun
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        try:
+            while self.running:
+                phrase = self.generate()
+                while self.running:
+                    try:
+                        self.queue.put(phrase, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+        finally:
+            self.running = False
+
+    def get(self):
+        """Return the next phrase, or None once the buffer has stopped"""
+        try:
+            phrase = self.queue.get_nowait()
+        except queue.Empty:
+            self.underruns += 1
+            start = monotonic()
+            phrase = None
+            while phrase is None and (self.running or not self.queue.empty()):
+                try:
+                    phrase = self.queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if phrase is None:
+                return None
+            self.wait.record((monotonic() - start) * 1e6)
+        self.phrases += 1
+        return phrase
+
+    def report(self):
+        wait = self.wait.summary()
+        print(f"{self.name}: {self.phrases} phrases, {self.underruns} underruns (depth {self.depth}), "
+              f"underrun wait p50 {wait['p50']}us, p99 {wait['p99']}us, max {wait['max']}us")
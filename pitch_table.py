@@ -0,0 +1,62 @@
+"""
+Precomputed pitch name to MIDI number lookups for the live players
+
+usage:
+  from pitch_table import midi, name
+  midi('Eb4') # 63, same as music21 pitch.Pitch('Eb4').midi
+  name('Eb4') # 'E-', same as pitch.Pitch('Eb4').name
+
+Microbenchmark against music21:
+  python pitch_table.py
+"""
+LETTERS = { 'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11 }
+ACCIDENTALS = { '': 0, '#': 1, '##': 2, '-': -1, '--': -2, 'b': -1, 'bb': -2 }
+# music21's spelling of MIDI numbers
+PITCH_CLASS_NAMES = ['C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'G#', 'A', 'B-', 'B']
+
+MIDI = {}
+NAMES = {}
+for letter, semitone in LETTERS.items():
+    for accidental, shift in ACCIDENTALS.items():
+        m21_name = letter + accidental.replace('b', '-')
+        for spelling in (letter + accidental, letter.lower() + accidental):
+            NAMES[spelling] = m21_name
+            MIDI[spelling] = 60 + semitone + shift # no octave = octave 4, like music21
+            for octave in range(0, 10):
+                NAMES[spelling + str(octave)] = m21_name
+                MIDI[spelling + str(octave)] = 12 * (octave + 1) + semitone + shift
+for number in range(128):
+    NAMES[number] = PITCH_CLASS_NAMES[number % 12]
+    MIDI[number] = number
+
+def midi(note):
+    """MIDI number of a pitch name like 'C#4', 'Bb3' or 'E-5', or of a MIDI number"""
+    try:
+        return MIDI[note]
+    except KeyError:
+        from music21 import pitch
+        return pitch.Pitch(note).midi
+
+def name(note):
+    """music21-style pitch class name ('E-', 'F#') of a pitch name or MIDI number"""
+    try:
+        return NAMES[note]
+    except KeyError:
+        from music21 import pitch
+        return pitch.Pitch(note).name
+
+if __name__ == "__main__":
+    import timeit
+    from music21 import pitch
+
+    notes = ['C4', 'E-4', 'G4', 'Bb3', 'F#5', 'A2', 'D4', 'C#3']
+    for note in notes:
+        assert midi(note) == pitch.Pitch(note).midi, note
+        assert name(note) == pitch.Pitch(note).name, note
+    n = 10_000
+    m21 = timeit.timeit(lambda: [ pitch.Pitch(note).midi for note in notes ], number=n)
+    table = timeit.timeit(lambda: [ midi(note) for note in notes ], number=n)
+    lookups = n * len(notes)
+    print(f"music21 pitch.Pitch(...).midi: {1e6 * m21 / lookups:.2f}us per note")
+    print(f"pitch_table.midi(...):         {1e6 * table / lookups:.2f}us per note")
+    print(f"speedup: {m21 / table:.0f}x")
@@ -1,15 +1,14 @@
 from music21 import chord, duration, note, stream, tempo
-from pychord import Chord as pyChord
 import random
 import re
 from music_melodicdevice import Device
 from music_bassline_generator import Bassline
 from random_rhythms import Rhythm
+import chord_cache
 
 def first_verse():
     for i,my_chord in enumerate(chords):
-        c = pyChord(my_chord)
-        c = chord.Chord(c.components(), type='whole')
+        c = chord.Chord(chord_cache.components(my_chord), type='whole')
         chord_part.append(c)
         if i == 2:
             notes = device.transpose(3, pitches1)
@@ -25,8 +24,7 @@ def first_verse():
 
 def second_verse():
     for i,my_chord in enumerate(chords):
-        c = pyChord(my_chord)
-        c = chord.Chord(c.components(), type='whole')
+        c = chord.Chord(chord_cache.components(my_chord), type='whole')
         chord_part.append(c)
         if i == 2:
             notes = device.transpose(3, pitches1)
@@ -42,8 +40,7 @@ def second_verse():
 
 def third_verse():
     for i,my_chord in enumerate(chords):
-        c = pyChord(my_chord)
-        c = chord.Chord(c.components(), type='whole')
+        c = chord.Chord(chord_cache.components(my_chord), type='whole')
         chord_part.append(c)
         if i == 2:
             notes = device.transpose(3, pitches2)
@@ -58,8 +55,7 @@ def third_verse():
 
 def fourth_verse():
     for i,my_chord in enumerate(chords):
-        c = pyChord(my_chord)
-        c = chord.Chord(c.components(), type='whole')
+        c = chord.Chord(chord_cache.components(my_chord), type='whole')
         chord_part.append(c)
         if i == 2:
             notes = device.transpose(3, pitches1)
@@ -76,12 +72,12 @@ def fourth_verse():
 def pre_chorus():
     for j,d in enumerate(motifs2[0]):
         my_chord = random.choice(unique2)
-        c = pyChord(my_chord)
-        parts = chord.Chord(c.components())
+        comp = chord_cache.components(my_chord)
+        parts = chord.Chord(comp)
         parts.duration = duration.Duration(d)
         chord_part.append(parts)
         if j == 0:
-            n = c.components()[0] + '2' # set the octave
+            n = comp[0] + '2' # set the octave
             n = note.Note(n, type='whole')
             bass_part.append(n)
 
@@ -89,21 +85,19 @@ def chorus():
     for i in range(2):
         for j,d in enumerate(motifs2[1]):
             my_chord = random.choice(unique3)
-            c = pyChord(my_chord)
-            comp = c.components()
+            comp = chord_cache.components(my_chord)
             length = len(comp) - 1
             comp.pop(random.randint(0, length))
             parts = chord.Chord(comp)
             parts.duration = duration.Duration(d)
             chord_part.append(parts)
             if j == 0:
-                n = c.components()[0] + '2' # set the octave
+                n = chord_cache.components(my_chord)[0] + '2' # set the octave
                 n = note.Note(n, type='whole')
                 bass_part.append(n)
 
 def resolution():
-    c = pyChord(chords[0])
-    c = chord.Chord(c.components(), type='whole')
+    c = chord.Chord(chord_cache.components(chords[0]), type='whole')
     chord_part.append(c)
     match = re.search(r'^([a-gA-G][#b]?)', chords[0])
     if match:
@@ -0,0 +1,112 @@
+"""
+Opt-in CPU pinning and real-time scheduling for clock threads
+
+Clock threads read their settings from the CLOCK_REALTIME environment
+variable, e.g.:
+  CLOCK_REALTIME='policy=fifo,priority=80,cpus=3' python midi-thread-6.py
+
+policy is fifo or rr, and cpus is a list like 3, 2-3 or 0:2.
+
+Jitter comparison of a clock run with and without the settings:
+  python realtime.py [seconds] [port] [policy] [priority] [cpus]
+  python realtime.py 30 SE-02 fifo 80 3
+"""
+import os
+import sys
+import time
+
+POLICIES = {
+    'fifo': 'SCHED_FIFO',
+    'rr': 'SCHED_RR',
+}
+
+def parse(spec):
+    """Parse 'policy=fifo,priority=80,cpus=2-3' into keyword arguments"""
+    settings = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        key, value = [ i.strip() for i in item.split('=', 1) ]
+        if key == 'priority':
+            settings[key] = int(value)
+        elif key == 'cpus':
+            settings[key] = parse_cpus(value)
+        else:
+            settings[key] = value
+    return settings
+
+def parse_cpus(value):
+    cpus = set()
+    for part in value.replace(' ', '').split(':'):
+        if '-' in part:
+            lo, hi = part.split('-')
+            cpus.update(range(int(lo), int(hi) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+def from_env():
+    spec = os.environ.get('CLOCK_REALTIME')
+    return parse(spec) if spec else None
+
+def set_realtime(priority=None, policy='fifo', cpus=None):
+    """
+    Pin the calling thread to cpus and give it a real-time scheduling
+    policy. Each setting that the platform or the process permissions do
+    not allow is reported and skipped, so the clock keeps running at
+    default priority. Returns the list of settings that were applied.
+    """
+    applied = []
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+            applied.append(f"cpus={sorted(cpus)}")
+        except (AttributeError, OSError) as e:
+            print(f"WARNING: cannot pin clock to CPUs {sorted(cpus)}: {e}")
+    if priority:
+        try:
+            name = POLICIES[policy]
+            os.sched_setscheduler(0, getattr(os, name), os.sched_param(priority))
+            applied.append(f"{name}:{priority}")
+        except KeyError:
+            print(f"WARNING: unknown scheduling policy {policy!r}, use one of {list(POLICIES)}")
+        except (AttributeError, OSError) as e:
+            print(f"WARNING: cannot set {policy} priority {priority}: {e}")
+    return applied
+
+if __name__ == "__main__":
+    from clock_stats import ClockStats
+    from midi_clock import Clock
+
+    seconds  = int(sys.argv[1])            if len(sys.argv) > 1 else 10
+    name     = sys.argv[2]                 if len(sys.argv) > 2 else None # no port = discard the clock
+    policy   = sys.argv[3]                 if len(sys.argv) > 3 else 'fifo'
+    priority = int(sys.argv[4])            if len(sys.argv) > 4 else 80
+    cpus     = parse_cpus(sys.argv[5])     if len(sys.argv) > 5 else None
+    bpm = 120
+
+    class NullPort(object):
+        def send(self, msg):
+            pass
+        def close(self):
+            pass
+
+    if name:
+        import mido
+        port = mido.open_output(name)
+    else:
+        port = NullPort()
+
+    try:
+        for label, settings in [
+            ('default', {}),
+            ('realtime', { 'priority': priority, 'policy': policy, 'cpus': cpus }),
+        ]:
+            stats = ClockStats(f"clock {label}", bpm)
+            clock = Clock(port, bpm, stats=stats, realtime=settings)
+            clock.start()
+            time.sleep(seconds)
+            clock.stop()
+            stats.report()
+    finally:
+        port.close()
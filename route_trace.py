@@ -0,0 +1,136 @@
+"""
+Per-route latency tracing for the MIDI routers
+
+usage:
+  > ROUTE_TRACE=trace.jsonl python midi-control.py midi-rock-stone-SE-02.yaml
+
+  trace = RouteTrace('midi-control') # enabled by $ROUTE_TRACE
+  trace.start()
+  ... in the input callback:
+  received = time.monotonic()
+  ...
+  dispatched = time.monotonic()
+  outport.send(msg)
+  trace.record('control_change 1', received, dispatched, time.monotonic())
+  ...
+  trace.stop()
+  trace.report()
+"""
+import json
+import os
+import threading
+import time
+from clock_stats import Histogram
+
+def percentiles(histogram):
+    return {
+        'p50': histogram.percentile(50),
+        'p95': histogram.percentile(95),
+        'p99': histogram.percentile(99),
+        'max': histogram.max,
+    }
+
+class RouteStats(object):
+    def __init__(self):
+        self.dispatch = Histogram() # microseconds from receive to dispatch
+        self.send = Histogram() # microseconds from dispatch until the send returned
+        self.total = Histogram() # microseconds from receive until the send returned
+
+    def record(self, received, dispatched, sent):
+        self.dispatch.record((dispatched - received) * 1e6)
+        self.send.record((sent - dispatched) * 1e6)
+        self.total.record((sent - received) * 1e6)
+
+    def summary(self, elapsed):
+        return {
+            'count': self.total.total,
+            'rate': round(self.total.total / elapsed, 1) if elapsed else 0,
+            'dispatch_us': percentiles(self.dispatch),
+            'send_us': percentiles(self.send),
+            'total_us': percentiles(self.total),
+        }
+
+class RouteTrace(object):
+    """
+    Collect receive, dispatch and send times per route, and every period
+    seconds append one JSON line per active route to path (or
+    $ROUTE_TRACE) with that period's p50/p95/p99 and throughput. Receive
+    is when the input callback got the parsed message, dispatch when the
+    route's action started (after any coalescing hold), and send when the
+    output call returned, so the dispatch and send columns separate the
+    router's own time from the backend's. Without a path, record() does
+    nothing.
+    """
+    def __init__(self, name, path=None, period=10):
+        self.name = name
+        self.path = path or os.environ.get('ROUTE_TRACE')
+        self.period = period
+        self.lock = threading.Lock()
+        self.routes = {} # since the last dump
+        self.totals = {} # since start
+        self.started = None
+        self.dumped = None
+        self.stopping = threading.Event()
+        self.thread = None
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def record(self, route, received, dispatched, sent):
+        if not self.path:
+            return
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteStats()
+            stats.record(received, dispatched, sent)
+            stats = self.totals.get(route)
+            if stats is None:
+                stats = self.totals[route] = RouteStats()
+            stats.record(received, dispatched, sent)
+
+    def start(self):
+        self.started = self.dumped = time.monotonic()
+        if not self.path:
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopping.wait(self.period):
+            self.dump()
+
+    def dump(self):
+        """Append this period's summary per route to the trace file"""
+        now = time.monotonic()
+        with self.lock:
+            routes, self.routes = self.routes, {}
+            elapsed, self.dumped = now - self.dumped, now
+        if not routes:
+            return
+        with open(self.path, 'a') as f:
+            for route, stats in routes.items():
+                line = { 'name': self.name, 'time': round(time.time(), 3), 'route': route, 'period': round(elapsed, 3) }
+                line.update(stats.summary(elapsed))
+                f.write(json.dumps(line) + '\n')
+
+    def stop(self):
+        if not self.path or self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join(timeout=5) # let a dump in progress finish before the last one
+        self.thread = None
+        self.dump()
+
+    def report(self):
+        if not self.path:
+            return
+        elapsed = time.monotonic() - self.started
+        for route, stats in sorted(self.totals.items()):
+            s = stats.summary(elapsed)
+            total = s['total_us']
+            print(f"{route}: {s['count']} messages ({s['rate']}/s), latency p50 {total['p50']}us, "
+                  f"p95 {total['p95']}us, p99 {total['p99']}us, max {total['max']}us "
+                  f"(dispatch p99 {s['dispatch_us']['p99']}us, send p99 {s['send_us']['p99']}us)")
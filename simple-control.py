@@ -1,26 +1,44 @@
 import mido
 import sys
+import time
+import midi_input
+from route_trace import RouteTrace
 
 in_port_name = sys.argv[1] if len(sys.argv) > 1 else sys.argv[0]
 out_port_name = sys.argv[2] if len(sys.argv) > 2 else sys.argv[0]
+# types to stop forwarding, e.g. 'clock' or 'clock,sysex'; everything is forwarded by default
+drop = sys.argv[3].split(',') if len(sys.argv) > 3 else []
+
+# receive and send times per message type, when $ROUTE_TRACE names a file
+trace = RouteTrace('simple-control')
+
+def forward(msg):
+    received = time.monotonic()
+    print(f"Received: {msg}")
+    dispatched = time.monotonic()
+    outport.send(msg)
+    trace.record(msg.type, received, dispatched, time.monotonic())
 
 try:
-    inport = mido.open_input(in_port_name)
-    print(f"Listening for messages from: {inport.name}")
     outport = mido.open_output(out_port_name)
     print(f"Sending messages to: {outport.name}")
+    # called from the input's thread; dropped types never reach Python with rtmidi
+    inport = midi_input.open_input(in_port_name, forward, clock='clock' not in drop, sysex='sysex' not in drop)
+    print(f"Listening for messages from: {inport.name}")
 except (ValueError, OSError) as e:
     print(f"Error opening ports: {e}")
     exit()
 
 print("Routing MIDI messages. Ctrl+C to exit.")
+trace.start()
 try:
-    for msg in inport:
-        print(f"Received: {msg}")
-        outport.send(msg)
+    while True:
+        time.sleep(1)
 
 except KeyboardInterrupt:
     print("\nExiting MIDI router.")
 finally:
     inport.close()
     outport.close()
+    trace.stop()
+    trace.report()
@@ -0,0 +1,302 @@
+"""
+Play any number of voices from a YAML voice spec, on one clock, one
+voice thread and one note scheduler
+
+usage:
+  > python voice_engine.py [voices.yaml]
+
+  engine = VoiceEngine(spec)
+  engine.start()
+  ...
+  engine.stop()
+  engine.report()
+"""
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from fractions import Fraction
+import mido
+import yaml
+from clock_stats import ClockStats
+from midi_clock import Clock
+from clock_process import ClockProcess
+from beat_bus import BeatBus
+from note_scheduler import NoteScheduler
+from generation_pool import GenerationPool
+from note_tracker import NoteTracker
+import pitch_table
+
+# clock ticks per beat
+CLOCKS_PER_BEAT = 24
+
+def duration(value):
+    """A YAML duration, either a number or a fraction string like '1/3'"""
+    return float(Fraction(str(value)))
+
+def rhythm(voice):
+    """The voice's motif generator over its durations pool"""
+    from random_rhythms import Rhythm
+    durations = [ duration(d) for d in voice.get('durations', [ '1/8', '1/4', '1/2' ]) ]
+    if 'groups' in voice:
+        groups = { duration(d): n for d, n in voice['groups'].items() }
+        return Rhythm(measure_size=voice.get('measure', 1), durations=durations, groups=groups)
+    return Rhythm(measure_size=voice.get('measure', 1), durations=durations)
+
+def progression_voice(voice, settings):
+    """Chord progression network arpeggiated over rhythm motifs"""
+    from chord_progression_network import Generator
+    from music_melodicdevice import Device
+    scale_map = settings['scale_map']
+    size = len(scale_map) + 1
+    transitions = [ i for i in range(1, size) ]
+    weights = [ 1 for _ in range(1, size) ]
+    g = Generator(
+        scale_note=settings.get('scale_note', 'C'),
+        scale_name=settings.get('scale_name', 'ionian'),
+        max=voice.get('chords', 4), # beats x measures
+        tonic=False,
+        resolve=False,
+        scale=list(scale_map.keys()),
+        chord_map=list(scale_map.values()),
+        net={ i: transitions for i in range(1, size) },
+        weights={ i: weights for i in range(1, size) },
+        verbose=False,
+    )
+    device = Device(verbose=False)
+    r = rhythm(voice)
+    arp_type = voice.get('arp', 'updown')
+    drop = voice.get('drop', 0) # chance of playing the phrase an octave down
+
+    def phrase():
+        shift = -12 if random.random() < drop else 0
+        motif = r.motif()
+        notes = []
+        for ph in g.generate():
+            arped = device.arp(ph, duration=1, arp_type=arp_type, repeats=1)
+            for i,d in enumerate(motif):
+                notes.append((pitch_table.midi(arped[i % len(arped)][1]) + shift, d))
+        return notes
+    return phrase
+
+def bassline_voice(voice, settings):
+    """Bassline over a random chord of the scale map, one note per beat"""
+    from music_bassline_generator import Bassline
+    scale_map = settings['scale_map']
+    bass = Bassline(
+        modal=voice.get('modal', True),
+        tonic=False,
+        resolve=False,
+    )
+    count = voice.get('notes', 4)
+    dura = duration(voice.get('duration', 1))
+
+    def phrase():
+        note = random.choice(list(scale_map.keys()))
+        return [ (n, dura) for n in bass.generate(note + scale_map[note], count) ]
+    return phrase
+
+def voicegen_voice(voice, settings):
+    """Random walk over a pitch set by the allowed intervals"""
+    from music_voicegen import MusicVoiceGen
+    v = MusicVoiceGen(
+        pitches=voice['pitches'],
+        intervals=voice.get('intervals', [-2,-1,1,2]),
+    )
+    r = rhythm(voice)
+
+    def phrase():
+        return [ (v.rand(), d) for d in r.motif() ]
+    return phrase
+
+def pso_voice(voice, settings):
+    """Chords from the pso-chord.pl particle swarm, arpeggiated over rhythm motifs"""
+    from music_melodicdevice import Device
+    device = Device(verbose=False)
+    r = rhythm(voice)
+    command = ['perl', voice.get('script', 'pso-chord.pl')]
+    arp_type = voice.get('arp', 'updown')
+    repeats = voice.get('repeats', 4)
+
+    def phrase():
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        chord = [ pitch_table.midi(n) for n in result.stdout.split() ]
+        motif = r.motif()
+        arped = device.arp(chord, duration=1, arp_type=arp_type, repeats=1)
+        notes = []
+        for _ in range(repeats):
+            for i,d in enumerate(motif):
+                notes.append((pitch_table.midi(arped[i % len(arped)][1]), d))
+        return notes
+    return phrase
+
+GENERATORS = {
+    'progression': progression_voice,
+    'arp': progression_voice,
+    'bassline': bassline_voice,
+    'voicegen': voicegen_voice,
+    'pso': pso_voice,
+}
+
+def voice_setup(voice, settings):
+    """Build the voice's generator and return its phrase function, with the octave shift and pace applied"""
+    phrase = GENERATORS[voice.get('generator', 'progression')](voice, settings)
+    shift = 12 * voice.get('octave', 0)
+    factor = settings.get('factor', 1)
+
+    def shifted():
+        return [ (n + shift, d * factor) for n, d in phrase() ]
+    return shifted
+
+class VoiceEngine(object):
+    """
+    Run the voices of a spec (see voices.yaml) from one beat-driven voice
+    thread. Each voice's next phrase is generated while its current one
+    plays, in the workers of one shared GenerationPool (workers: 1 by
+    default), or inline with pool: false, and whole phrases are handed to
+    a shared NoteScheduler, so neither the thread nor the process count
+    grows with the number of voices. The clock runs in-process by
+    default; clock: process moves it to a ClockProcess, which opens the
+    ports again in the child, so give it ports no other program holds.
+    """
+    def __init__(self, spec):
+        self.spec = spec
+        self.bpm = spec.get('bpm', 100)
+        self.timing = spec.get('timing', 'sleep') # or 'grid': notes on the clock's ticks
+        self.voices = []
+        for i, v in enumerate(spec['voices']):
+            voice = dict(v)
+            voice.setdefault('name', f"voice{i}")
+            voice.setdefault('channel', i)
+            voice.setdefault('port', spec['port'])
+            voice.setdefault('velocity', spec.get('velocity', 100))
+            voice.setdefault('spread', spec.get('spread', 10))
+            if voice.get('generator', 'progression') not in GENERATORS:
+                raise ValueError(f"{voice['name']}: unknown generator {voice['generator']}")
+            self.voices.append(voice)
+        self.settings = { k: v for k, v in spec.items() if k != 'voices' }
+        self.pool = GenerationPool(spec.get('workers', 1)) if spec.get('pool', True) else None
+        self.bus = BeatBus()
+        self.tracker = NoteTracker()
+        self.scheduler = NoteScheduler(tracker=self.tracker)
+        self.stats = ClockStats(spec.get('name', 'voice-engine'), self.bpm, CLOCKS_PER_BEAT)
+        self.ports = {}
+        self.clock = None
+        self.thread = None
+        self.running = False
+
+    def _next(self, voices):
+        """Generate the voices' next phrases, in the pool's workers or inline without a pool"""
+        if self.pool:
+            futures = [ self.pool.submit(voice['name']) for voice in voices ]
+            for voice, future in zip(voices, futures):
+                voice['next'] = self.pool.result(future)
+        else:
+            for voice in voices:
+                voice['next'] = voice['phrase']()
+
+    def start(self):
+        for voice in self.voices:
+            if self.pool:
+                self.pool.add(voice['name'], voice_setup, dict(voice), self.settings)
+            else:
+                voice['phrase'] = voice_setup(voice, self.settings)
+            if voice['port'] not in self.ports:
+                self.ports[voice['port']] = mido.open_output(voice['port'])
+            voice['out'] = self.ports[voice['port']]
+            if 'program' in voice:
+                voice['out'].send(mido.Message('program_change', channel=voice['channel'], program=voice['program']))
+        if self.spec.get('clock', 'thread') == 'process':
+            self.clock = ClockProcess(list(self.ports), self.bpm, CLOCKS_PER_BEAT, on_beat=self.bus.publish, stats=self.stats)
+        else:
+            self.clock = Clock(list(self.ports.values()), self.bpm, CLOCKS_PER_BEAT, on_beat=self.bus.publish, stats=self.stats)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.scheduler.start()
+        self.clock.start()
+        self.thread.start()
+        for port in self.ports.values():
+            port.send(mido.Message('start'))
+
+    def play(self, voice, notes, start):
+        """Schedule (note, duration) pairs back to back from start and return when they end"""
+        low, high = voice['velocity'] - voice['spread'], voice['velocity'] + voice['spread']
+        for note, dura in notes:
+            velocity = max(1, min(127, random.randint(low, high)))
+            self.scheduler.note(voice['out'], voice['channel'], note, velocity, start, dura)
+            start += dura
+        return start
+
+    def play_on_grid(self, voice, notes, start_tick):
+        """Schedule (note, beats) pairs at tick offsets from start_tick and return when they end"""
+        low, high = voice['velocity'] - voice['spread'], voice['velocity'] + voice['spread']
+        position = 0.0 # ticks into the phrase
+        for note, beats in notes:
+            on = self.clock.tick_time(start_tick + round(position))
+            position += beats * CLOCKS_PER_BEAT
+            off = self.clock.tick_time(start_tick + round(position))
+            velocity = max(1, min(127, random.randint(low, high)))
+            self.scheduler.note(voice['out'], voice['channel'], note, velocity, on, off - on)
+        return self.clock.tick_time(start_tick + round(position))
+
+    def _run(self):
+        beats = self.bus.subscribe('voices')
+        for voice in self.voices:
+            voice['free'] = 0 # when the voice's last phrase ends
+        self._next(self.voices)
+        while self.running:
+            if beats.wait() is None: # wait for the next beat
+                break
+            now = time.monotonic()
+            started = [ voice for voice in self.voices if voice['free'] <= now ]
+            for voice in started: # schedule every free voice on this beat first
+                if self.timing == 'grid':
+                    voice['free'] = self.play_on_grid(voice, voice['next'], self.clock.beats * CLOCKS_PER_BEAT)
+                else:
+                    voice['free'] = self.play(voice, voice['next'], now)
+            self._next(started) # generate while these play
+
+    def stop(self):
+        for port in self.ports.values():
+            port.send(mido.Message('stop'))
+        self.running = False
+        self.clock.stop()
+        self.bus.close()
+        self.thread.join()
+        self.scheduler.stop()
+        if self.pool:
+            self.pool.shutdown()
+        self.tracker.release()
+        for port in self.ports.values():
+            port.close()
+
+    def report(self):
+        self.stats.report()
+        self.bus.report()
+        self.scheduler.report()
+        if self.pool:
+            self.pool.report()
+        self.tracker.report()
+
+if __name__ == "__main__":
+    spec_file = sys.argv[1] if len(sys.argv) > 1 else 'voices.yaml'
+    if not os.path.exists(spec_file):
+        print(spec_file, 'does not exist')
+        sys.exit()
+
+    with open(spec_file, 'r') as f:
+        spec = yaml.safe_load(f)
+
+    engine = VoiceEngine(spec)
+    engine.start()
+    print(f"Playing {len(engine.voices)} voices on {', '.join(engine.ports)}")
+    try:
+        while True:
+            time.sleep(0.5) # keep main thread alive and respond to interrupts
+    except KeyboardInterrupt:
+        print("\nSignaling threads to stop...")
+        engine.stop()
+        print("All threads stopped.")
+        engine.report()